@@ -0,0 +1,218 @@
+"""
+Env throughput benchmark.
+
+Runs fixed-seed random and scripted policies against every env over several grid sizes and stock counts,
+and reports steps/sec, reset latency, p50/p99 step latency and peak traced memory as JSON.
+
+    python -m benchmarks.bench_envs --steps 20000 --output bench.json
+    python -m benchmarks.bench_envs --envs GridCommander Maze --sizes 5 10
+    python -m benchmarks.bench_envs --envs PaddedStorageYard BucketedStorageYard --sizes 5 12 20
+    python -m benchmarks.bench_envs --envs GridCommander --profile 16
+
+Run it from the repository root so that `src` can be imported.
+"""
+import argparse
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+
+import numpy as np
+
+from src.env.commander import GridCommander
+from src.env.commander_discrete import DiscreteCommander
+from src.env.commander_only_grid import GridOnlyCommander
+from src.env.env_simple_discrete_transporter import SimpleTransporter
+from src.env.env_transporter import StorageYard, MAX_GRID_SIZE
+from src.env.maze import Maze
+from src.env.yard_buckets import BUCKET_SIZES, bucket_shape
+from src.utils.profiling import instrument
+
+# fraction of the free cells that start with a stock
+STOCK_RATIOS = (0.25, 0.5, 0.9)
+# maze maps are rejection sampled until the goal is reachable, dense mazes take too long to generate
+MAZE_STOCK_RATIOS = (0.1, 0.2, 0.4)
+# action sequence replayed by the scripted policy of the move-based envs
+SCRIPTED_MOVES = (0, 3, 4, 1, 2, 4)
+
+
+def make_commander(cls):
+    def make(n_row, n_col, n_stocks):
+        env = cls(n_row, n_col)
+        env.reset_n_stocks = n_stocks
+        env.upgrade_interval = np.iinfo(np.int64).max
+        return env
+    return make
+
+
+def make_storage_yard(max_size=MAX_GRID_SIZE):
+    """
+    :param max_size: int, (rows, cols) or a function of (n_row, n_col) returning one, see StorageYard
+    """
+    def make(n_row, n_col, n_stocks):
+        env = StorageYard(n_row, n_col, max_size=max_size(n_row, n_col) if callable(max_size) else max_size)
+        env.init_n_stocks = n_stocks
+        return env
+    return make
+
+
+def make_simple_transporter(n_row, n_col, n_stocks):
+    env = SimpleTransporter(n_row, n_col, init_n_stocks=n_stocks)
+    env.upgrade_interval = np.iinfo(np.int64).max
+    return env
+
+
+def make_maze(n_row, n_col, n_stocks):
+    env = Maze(n_row, n_col)
+    env.stock_prob = n_stocks / (n_row * n_col)
+    env.max_steps = 4 * n_row * n_col
+    return env
+
+
+# name -> (factory(n_row, n_col, n_stocks), number of cells stocks can be placed on, stock ratios, max grid size)
+ENVS = {
+    "GridCommander": (make_commander(GridCommander), lambda r, c: r * (c - 1), STOCK_RATIOS, None),
+    "DiscreteCommander": (make_commander(DiscreteCommander), lambda r, c: r * (c - 1), STOCK_RATIOS, None),
+    "GridOnlyCommander": (make_commander(GridOnlyCommander), lambda r, c: r * (c - 1), STOCK_RATIOS, None),
+    "StorageYard": (make_storage_yard(), lambda r, c: r * c - 1, STOCK_RATIOS, MAX_GRID_SIZE),
+    # every yard padded to the largest bucket, as when all sizes share one observation space
+    "PaddedStorageYard": (make_storage_yard(max(BUCKET_SIZES)), lambda r, c: r * c - 1, STOCK_RATIOS,
+                          max(BUCKET_SIZES)),
+    # every yard padded only to its own bucket, as in src.env.yard_buckets.BucketedStorageYards
+    "BucketedStorageYard": (make_storage_yard(bucket_shape), lambda r, c: r * c - 1, STOCK_RATIOS,
+                            max(BUCKET_SIZES)),
+    "SimpleTransporter": (make_simple_transporter, lambda r, c: r * (c - 1), STOCK_RATIOS, None),
+    "Maze": (make_maze, lambda r, c: r * c, MAZE_STOCK_RATIOS, None),
+}
+
+
+def is_commander(env) -> bool:
+    return isinstance(env, (GridCommander, DiscreteCommander, GridOnlyCommander))
+
+
+def choose_action(env, policy: str, rng: np.random.Generator, t: int):
+    if is_commander(env):
+        if policy == "scripted":
+            action = rng.choice(np.flatnonzero(env.action_masks()))
+        else:
+            action = rng.integers(env.n_row * env.n_col)
+        return action // env.n_col, action % env.n_col
+    if policy == "scripted":
+        return SCRIPTED_MOVES[t % len(SCRIPTED_MOVES)] % env.action_space.n
+    return int(rng.integers(env.action_space.n))
+
+
+def run_case(name: str, n_row: int, n_col: int, n_stocks: int, policy: str, n_steps: int, seed: int,
+             profile: int = None) -> dict:
+    """
+    Benchmark one (env, size, stocks, policy) case
+    :param profile: if set, time the env phases with src.utils.profiling, one call in profile
+    :return: dict of metrics
+    """
+    factory = ENVS[name][0]
+    rng = np.random.default_rng(seed)
+    env = factory(n_row, n_col, n_stocks)
+    profiler = None if profile is None else instrument(env, profile)
+
+    step_ns = np.empty(n_steps, dtype=np.int64)
+    reset_ns = []
+
+    start = time.perf_counter_ns()
+    # the envs draw from their own np_random, seeded by the first reset
+    env.reset(seed=seed)
+    reset_ns.append(time.perf_counter_ns() - start)
+    for t in range(n_steps):
+        action = choose_action(env, policy, rng, t)
+        start = time.perf_counter_ns()
+        _, _, terminated, truncated, _ = env.step(action)
+        step_ns[t] = time.perf_counter_ns() - start
+        if terminated or truncated:
+            start = time.perf_counter_ns()
+            env.reset()
+            reset_ns.append(time.perf_counter_ns() - start)
+
+    # memory is traced in a separate short run, tracemalloc slows every allocation down
+    rng = np.random.default_rng(seed)
+    tracemalloc.start()
+    env = factory(n_row, n_col, n_stocks)
+    env.reset(seed=seed)
+    for t in range(min(n_steps, 1_000)):
+        _, _, terminated, truncated, _ = env.step(choose_action(env, policy, rng, t))
+        if terminated or truncated:
+            env.reset()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    reset_ns = np.array(reset_ns)
+    result = {
+        "env": name,
+        "n_row": n_row,
+        "n_col": n_col,
+        "n_stocks": n_stocks,
+        "policy": policy,
+        "steps": n_steps,
+        "episodes": len(reset_ns) - 1,
+        "steps_per_sec": n_steps / (step_ns.sum() / 1e9),
+        "step_p50_us": float(np.percentile(step_ns, 50)) / 1e3,
+        "step_p99_us": float(np.percentile(step_ns, 99)) / 1e3,
+        "reset_mean_us": float(reset_ns.mean()) / 1e3,
+        "reset_p99_us": float(np.percentile(reset_ns, 99)) / 1e3,
+        "peak_memory_kb": peak / 1024,
+    }
+    if profiler is not None:
+        result["profile"] = profiler.stats()
+    return result
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--envs", nargs="+", choices=list(ENVS), default=list(ENVS))
+    parser.add_argument("--sizes", nargs="+", type=int, default=[5, 8, 10], help="square grid sizes")
+    parser.add_argument("--policies", nargs="+", choices=["random", "scripted"], default=["random", "scripted"])
+    parser.add_argument("--steps", type=int, default=10_000, help="steps per case")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="JSON file to write, stdout if omitted")
+    parser.add_argument("--profile", type=int, default=None, metavar="SAMPLE_EVERY",
+                        help="report per-phase timings, timing one call in SAMPLE_EVERY (slows the steps down)")
+    args = parser.parse_args()
+
+    results = []
+    for name in args.envs:
+        _, n_cells, ratios, max_size = ENVS[name]
+        for size in args.sizes:
+            if max_size is not None and size > max_size:
+                continue
+            for ratio in ratios:
+                n_stocks = max(1, int(n_cells(size, size) * ratio))
+                for policy in args.policies:
+                    result = run_case(name, size, size, n_stocks, policy, args.steps, args.seed, args.profile)
+                    results.append(result)
+                    print(f"{name:<20} {size}x{size} stocks={n_stocks:<3} {policy:<8} "
+                          f"{result['steps_per_sec']:>12,.0f} steps/s  "
+                          f"p99 {result['step_p99_us']:8.1f}us  reset {result['reset_mean_us']:8.1f}us", flush=True)
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "seed": args.seed,
+        "results": results,
+    }
+    if args.output is None:
+        print(json.dumps(report, indent=2))
+    else:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Parity check of the compiled step kernels against the python step logic of the commander envs.
+
+Every env is run twice side by side, once with backend="python" and once on the kernel path, from the same start
+yards with the same actions. After each step the observations, rewards, dones, action masks, priority indexes and
+stock counts have to be equal. Start yards are random resets and scenarios with stocks, often the priority 1 one,
+already in the exit column; actions mix valid, invalid and put-back moves.
+
+    python -m benchmarks.check_kernel_parity
+    python -m benchmarks.check_kernel_parity --steps 50000 --sizes 4 6 9
+
+Without numba the kernels run uncompiled, which still checks their logic. Exits with 1 on the first mismatch.
+Run it from the repository root so that `src` can be imported.
+"""
+import argparse
+import sys
+
+import numpy as np
+
+from src.env import yard
+from src.env.commander import GridCommander
+from src.env.commander_discrete import DiscreteCommander
+from src.env.commander_only_grid import GridOnlyCommander
+from src.utils.kernels import numba
+
+ENVS = {
+    "GridCommander": GridCommander,
+    "DiscreteCommander": DiscreteCommander,
+    "GridOnlyCommander": GridOnlyCommander,
+}
+
+
+def make_pair(cls, size: int) -> tuple:
+    python_env = cls(size, size, backend="python")
+    kernel_env = cls(size, size, backend="python" if numba is None else "numba")
+    # without numba the kernels are plain python functions, the kernel path is still taken
+    kernel_env.backend = "numba"
+    for env in (python_env, kernel_env):
+        env.upgrade_interval = np.iinfo(np.int64).max
+    return python_env, kernel_env
+
+
+def exit_column_scenario(rng: np.random.Generator, size: int) -> np.ndarray:
+    """
+    Random ranks over all cells, the last column included, with priority 1 in the last column half of the time
+    """
+    n_stocks = int(rng.integers(2, size * (size - 1)))
+    cells = rng.choice(size * size, n_stocks, replace=False)
+    ranks = np.zeros(size * size, dtype=np.int64)
+    ranks[cells] = rng.permutation(n_stocks) + 1
+    ranks = ranks.reshape(size, size)
+    if rng.random() < 0.5:
+        first = tuple(np.argwhere(ranks == 1)[0])
+        row = int(rng.integers(size))
+        ranks[first], ranks[row, -1] = ranks[row, -1], ranks[first]
+    return ranks
+
+
+def start(envs, rng: np.random.Generator, size: int, seed: int):
+    envs[0].reset_n_stocks = envs[1].reset_n_stocks = int(rng.integers(1, size * (size - 1) + 1))
+    for env in envs:
+        env.reset(seed=seed)
+    if rng.random() < 0.5:
+        state = yard.make_state(exit_column_scenario(rng, size))
+        for env in envs:
+            env.set_yard_state(state)
+
+
+def pick_action(env, rng: np.random.Generator) -> tuple:
+    size = env.n_col
+    draw = rng.random()
+    if env.loaded_place is not None and draw < 0.3:
+        return env.loaded_place
+    if draw < 0.7:
+        action = int(rng.choice(np.flatnonzero(env.action_masks())))
+    else:
+        action = int(rng.integers(size * size))
+    return action // size, action % size
+
+
+def same(python_env, kernel_env, results) -> str:
+    """
+    :return: the first differing field, "" if the envs agree
+    """
+    (obs_a, reward_a, done_a, _, _), (obs_b, reward_b, done_b, _, _) = results
+    if not isinstance(obs_a, dict):
+        obs_a, obs_b = {None: obs_a}, {None: obs_b}
+    for key in obs_a:
+        if not np.array_equal(np.asarray(obs_a[key]), np.asarray(obs_b[key])):
+            return f"observation {key}"
+    if reward_a != reward_b or done_a != done_b:
+        return "reward or done"
+    if not np.array_equal(python_env.grid, kernel_env.grid):
+        return "grid"
+    if python_env.priorities.positions != kernel_env.priorities.positions:
+        return "priorities"
+    if python_env.n_stocks != kernel_env.n_stocks:
+        return "n_stocks"
+    if not np.array_equal(python_env.action_masks(), kernel_env.action_masks()):
+        return "action mask"
+    return ""
+
+
+def check(cls, size: int, steps: int, seed: int) -> bool:
+    envs = make_pair(cls, size)
+    rng = np.random.default_rng(seed)
+    start(envs, rng, size, seed)
+    episodes = 1
+    for step in range(steps):
+        action = pick_action(envs[0], rng)
+        results = [env.step(action) for env in envs]
+        field = same(*envs, results)
+        if field:
+            print(f"{cls.__name__} {size}x{size}: {field} differs at step {step}, action {action}")
+            return False
+        if results[0][2] or envs[0].n_steps >= 20 * size * size:
+            start(envs, rng, size, seed + step)
+            episodes += 1
+    print(f"{cls.__name__} {size}x{size}: {steps} steps, {episodes} episodes, ok")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--envs", nargs="+", choices=list(ENVS), default=list(ENVS))
+    parser.add_argument("--sizes", nargs="+", type=int, default=[4, 5, 7])
+    parser.add_argument("--steps", type=int, default=20_000, help="steps per env and size")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    ok = all([check(ENVS[name], size, args.steps, args.seed) for name in args.envs for size in args.sizes])
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,11 @@
+import argparse
+
 import gymnasium
 import numpy as np
 from stable_baselines3 import DQN, PPO
 
 from src.env.env_simple_discrete_transporter import SimpleTransporter
+from src.utils.vec_env import add_vec_env_arguments, make_vec_env
 
 ACTIONS = {
     'D' : 0,
@@ -12,10 +15,18 @@ ACTIONS = {
     'Q' : 4
 }
 
-env = SimpleTransporter(4, 4)
-model_name = "DQN4x4transporter_2M_sq6DNN_500_noDiffescal_trun2000"
 
-dqn = DQN("MultiInputPolicy", env, verbose=1, tensorboard_log=f"./logs/{model_name}", policy_kwargs={"net_arch": [5120, 5120, 5012, 5012, 5012, 5012]})
-print(dqn.policy)
-dqn.learn(total_timesteps=1_000_000)
-dqn.save(f"models/{model_name}")
\ No newline at end of file
+
+def make_env():
+    return SimpleTransporter(4, 4)
+
+
+if __name__ == "__main__":
+    args = add_vec_env_arguments(argparse.ArgumentParser()).parse_args()
+    env = make_vec_env(make_env, args.num_envs, args.backend)
+    model_name = "DQN4x4transporter_2M_sq6DNN_500_noDiffescal_trun2000"
+
+    dqn = DQN("MultiInputPolicy", env, verbose=1, tensorboard_log=f"./logs/{model_name}", policy_kwargs={"net_arch": [5120, 5120, 5012, 5012, 5012, 5012]})
+    print(dqn.policy)
+    dqn.learn(total_timesteps=1_000_000)
+    dqn.save(f"models/{model_name}")
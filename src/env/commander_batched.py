@@ -0,0 +1,253 @@
+import gymnasium as gym
+import numpy as np
+from stable_baselines3.common.vec_env import VecEnv
+
+from src.env.commander import EMPTY_CELL, SRC_POSITION_MARKER, NO_STOCK
+from src.utils.curriculum import SharedCurriculum
+from src.utils.grid import sample_cells
+
+
+class BatchedGridCommander(VecEnv):
+    """
+    N GridCommander yards kept in one (N, n_row, n_col) array and stepped together.
+    Actions are flat cell indices (row * n_col + col), the same as CommanderWrapper.
+    Finished yards are reset automatically, as SB3 expects from a VecEnv.
+    With a SharedCurriculum, the stock count is shared with the batches of other processes.
+    """
+
+    def __init__(self, num_envs: int = 8, n_row: int = 5, n_col: int = 5, seed: int = None,
+                 curriculum: SharedCurriculum = None):
+        self.n_row = n_row
+        self.n_col = n_col
+        self.render_mode = None
+
+        observation_space = gym.spaces.Dict({
+            "grid": gym.spaces.Box(low=-1, high=1, shape=(n_row, n_col)),
+            "loading_stock": gym.spaces.Box(low=-1, high=1, shape=(1,)),
+        })
+        action_space = gym.spaces.Discrete(n_row * n_col)
+        super().__init__(num_envs, observation_space, action_space)
+
+        # priority ranks like GridCommander's engine grid, scaled by priority_interval only in observe()
+        self.grid = np.full((num_envs, n_row, n_col), EMPTY_CELL, dtype=np.int16)
+        self.loading_priority = np.full(num_envs, NO_STOCK, dtype=np.int16)
+        self.loaded_row = np.zeros(num_envs, dtype=np.int64)
+        self.loaded_col = np.zeros(num_envs, dtype=np.int64)
+
+        self.priority_interval = 1 / (self.n_row * self.n_col)
+        self.n_stocks = np.zeros(num_envs, dtype=np.int64)
+
+        self.max_steps = None
+        self.n_steps = np.zeros(num_envs, dtype=np.int64)
+        self.loop_penalty = -0.1
+
+        self.complete_reward = 1
+        self.reset_n_stocks = 5
+
+        self.first_n_stocks = 5
+        self.final_n_stocks = 18
+
+        self.n_clear = 0
+        self.upgrade_interval = 2_000
+        self.curriculum = curriculum
+        self.curriculum_slot = None if curriculum is None else curriculum.attach()
+
+        self.rng = np.random.default_rng(seed)
+        self.stock_area = np.ones((n_row, n_col), dtype=bool)
+        self.stock_area[:, -1] = False
+        self.actions = None
+        self.env_index = np.arange(num_envs)
+
+    def observe(self, index=slice(None)):
+        grid = self.grid[index]
+        loading = self.loading_priority[index, None]
+        return {
+            "grid": np.where(grid == SRC_POSITION_MARKER, SRC_POSITION_MARKER,
+                             grid * self.priority_interval).astype(np.float32),
+            "loading_stock": np.where(loading == NO_STOCK, NO_STOCK, loading * self.priority_interval).astype(np.float32),
+        }
+
+    def reset(self):
+        self.reset_envs(self.env_index)
+        return self.observe()
+
+    def reset_envs(self, index: np.ndarray):
+        """
+        Place reset_n_stocks random stocks in every yard of index
+        :param index: 1D array of env indices
+        """
+        if self.curriculum is not None:
+            self.reset_n_stocks = self.curriculum.n_stocks
+        n_stocks = self.reset_n_stocks
+        # the picked cells of each yard get priorities 1..n_stocks
+        rows, cols = sample_cells(self.rng, self.stock_area, n_stocks, size=len(index))
+        self.grid[index] = EMPTY_CELL
+        self.grid[index[:, None], rows, cols] = np.arange(1, n_stocks + 1, dtype=np.int16)
+        self.loading_priority[index] = NO_STOCK
+        self.n_stocks[index] = n_stocks
+        self.n_steps[index] = 0
+
+    def step_async(self, actions: np.ndarray):
+        self.actions = np.asarray(actions, dtype=np.int64).reshape(self.num_envs)
+
+    def step_wait(self):
+        rows = self.actions // self.n_col
+        cols = self.actions % self.n_col
+        cells = self.grid[self.env_index, rows, cols]
+        loading = self.loading_priority != NO_STOCK
+        rewards = np.zeros(self.num_envs, dtype=np.float32)
+
+        # load
+        loaded = ~loading & (cells != EMPTY_CELL) & (cells != SRC_POSITION_MARKER)
+        index = self.env_index[loaded]
+        self.loading_priority[index] = cells[loaded]
+        self.grid[index, rows[loaded], cols[loaded]] = SRC_POSITION_MARKER
+        self.loaded_row[index] = rows[loaded]
+        self.loaded_col[index] = cols[loaded]
+        rewards[~loading & ~loaded] = self.loop_penalty
+
+        # unload back to the loaded place
+        put_back = loading & (rows == self.loaded_row) & (cols == self.loaded_col)
+        index = self.env_index[put_back]
+        self.grid[index, rows[put_back], cols[put_back]] = self.loading_priority[index]
+        rewards[put_back] = self.loop_penalty
+
+        # unload somewhere else
+        moving = loading & ~put_back
+        moved = np.zeros(self.num_envs, dtype=bool)
+        moved[moving] = self.reachable(self.env_index[moving], rows[moving], cols[moving])
+        index = self.env_index[moved]
+        self.grid[index, rows[moved], cols[moved]] = self.loading_priority[index]
+        self.grid[index, self.loaded_row[index], self.loaded_col[index]] = EMPTY_CELL
+        rewards[moving & ~moved] = self.loop_penalty
+
+        self.loading_priority[put_back | moved] = NO_STOCK
+        if index.size:
+            rewards[moved] = self.check_complete(index)
+
+        self.n_steps += 1
+        dones = self.n_stocks <= 0
+        truncated = np.zeros(self.num_envs, dtype=bool)
+        if self.max_steps is not None:
+            truncated = ~dones & (self.n_steps > self.max_steps)
+
+        if self.curriculum is not None:
+            self.curriculum.record_clear(self.curriculum_slot, int(dones.sum()))
+        else:
+            self.n_clear += int(dones.sum())
+            while self.n_clear >= self.upgrade_interval:
+                self.reset_n_stocks = min(self.reset_n_stocks + 1, self.final_n_stocks)
+                self.n_clear -= self.upgrade_interval
+
+        infos = [{} for _ in range(self.num_envs)]
+        finished = self.env_index[dones | truncated]
+        if finished.size:
+            terminal = self.observe(finished)
+            for i, env_idx in enumerate(finished):
+                infos[env_idx]["terminal_observation"] = {key: value[i] for key, value in terminal.items()}
+                infos[env_idx]["TimeLimit.truncated"] = bool(truncated[env_idx])
+            self.reset_envs(finished)
+
+        return self.observe(), rewards, dones | truncated, infos
+
+    def flood_fill(self, index: np.ndarray, rows: np.ndarray = None, cols: np.ndarray = None) -> np.ndarray:
+        """
+        Flood fill the passable cells from the loaded place of every yard in index.
+        All yards grow together, one 4-neighbour dilation per iteration.
+        :param index: 1D array of env indices
+        :param rows: 1D array of target rows, stop as soon as every target is reached
+        :param cols: 1D array of target cols
+        :return: (len(index), n_row, n_col) bool array
+        """
+        grid = self.grid[index]
+        passable = (grid == EMPTY_CELL) | (grid == SRC_POSITION_MARKER)
+        batch = np.arange(len(index))
+
+        reached = np.zeros_like(passable)
+        reached[batch, self.loaded_row[index], self.loaded_col[index]] = True
+        while True:
+            grown = reached.copy()
+            grown[:, 1:, :] |= reached[:, :-1, :]
+            grown[:, :-1, :] |= reached[:, 1:, :]
+            grown[:, :, 1:] |= reached[:, :, :-1]
+            grown[:, :, :-1] |= reached[:, :, 1:]
+            grown &= passable
+            if rows is not None and grown[batch, rows, cols].all():
+                return grown
+            if np.array_equal(grown, reached):
+                return grown
+            reached = grown
+
+    def reachable(self, index: np.ndarray, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        """
+        Check if (rows, cols) can be reached from the loaded place of every yard in index
+        :param index: 1D array of env indices
+        :param rows: 1D array of target rows
+        :param cols: 1D array of target cols
+        :return: 1D bool array
+        """
+        if index.size == 0:
+            return np.zeros(0, dtype=bool)
+        return self.flood_fill(index, rows, cols)[np.arange(len(index)), rows, cols]
+
+    def action_masks(self) -> np.ndarray:
+        """
+        Valid actions of every yard, same rules as GridCommander.action_masks
+        :return: (num_envs, n_row * n_col) bool array
+        """
+        masks = (self.grid != EMPTY_CELL) & (self.grid != SRC_POSITION_MARKER)
+        loading = self.env_index[self.loading_priority != NO_STOCK]
+        if loading.size:
+            reached = self.flood_fill(loading)
+            reached[np.arange(len(loading)), self.loaded_row[loading], self.loaded_col[loading]] = False
+            boxed_in = ~reached.any(axis=(1, 2))
+            reached[boxed_in, self.loaded_row[loading[boxed_in]], self.loaded_col[loading[boxed_in]]] = True
+            masks[loading] = reached
+        return masks.reshape(self.num_envs, -1)
+
+    def check_complete(self, index: np.ndarray) -> np.ndarray:
+        """
+        Remove the stocks which can leave the last column in priority order, then shift the remaining priorities
+        :param index: 1D array of env indices
+        :return: 1D array of rewards
+        """
+        last_col = self.grid[index, :, self.n_col - 1]
+        priorities = last_col.astype(np.int64)
+        priorities[(priorities < 0) | (priorities > self.n_row)] = 0
+
+        # present[:, p] is True if priority p is waiting in the last column; slot n_row + 1 always stays False
+        present = np.zeros((len(index), self.n_row + 2), dtype=bool)
+        present[np.arange(len(index))[:, None], priorities] = True
+        complete_count = np.argmin(present[:, 1:], axis=1)
+
+        last_col[(priorities > 0) & (priorities <= complete_count[:, None])] = EMPTY_CELL
+        self.grid[index, :, self.n_col - 1] = last_col
+
+        grid = self.grid[index]
+        self.grid[index] = np.where(grid > 0, grid - complete_count[:, None, None], grid)
+        self.n_stocks[index] -= complete_count
+        return complete_count * self.complete_reward
+
+    def close(self):
+        pass
+
+    def seed(self, seed: int = None):
+        self.rng = np.random.default_rng(seed)
+        return [seed for _ in range(self.num_envs)]
+
+    def get_attr(self, attr_name: str, indices=None):
+        value = getattr(self, attr_name)
+        indices = self._get_indices(indices)
+        if isinstance(value, np.ndarray) and value.shape[:1] == (self.num_envs,):
+            return [value[i] for i in indices]
+        return [value for _ in indices]
+
+    def set_attr(self, attr_name: str, value, indices=None):
+        setattr(self, attr_name, value)
+
+    def env_method(self, method_name: str, *method_args, indices=None, **method_kwargs):
+        result = getattr(self, method_name)(*method_args, **method_kwargs)
+        return [result[i] for i in self._get_indices(indices)]
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for _ in self._get_indices(indices)]
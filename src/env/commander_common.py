@@ -0,0 +1,140 @@
+import numpy as np
+
+from src.env import yard
+from src.utils.grid import sample_cells
+from src.utils.kernels import commander_mask, commander_step
+from src.utils.priority import PriorityIndex
+
+EMPTY_CELL = 0
+SRC_POSITION_MARKER = -1
+
+
+class CommanderMixin:
+    """
+    Engine methods shared by GridCommander, DiscreteCommander and GridOnlyCommander. The envs keep integer ranks in
+    self.grid and differ only in what marks the place of the loaded stock and in the loading_priority of an empty
+    cart, set by the class attributes below.
+    """
+    # loading_priority while nothing is loaded
+    NO_STOCK = -1
+    # True if the loaded place holds -rank, False if it holds SRC_POSITION_MARKER
+    NEGATE_LOADED = False
+
+    def loaded_marker(self, rank: int) -> int:
+        return -rank if self.NEGATE_LOADED else SRC_POSITION_MARKER
+
+    def action_masks(self):
+        """
+        Valid actions of the current phase, flattened like CommanderWrapper actions (row * n_col + col).
+        Loading: cells holding a stock.
+        Unloading: cells reachable from the loaded place, or only the loaded place if the stock is boxed in.
+        :return: 1D bool array of size n_row * n_col
+        """
+        mask = np.zeros(self.n_row * self.n_col, dtype=bool)
+        if self.backend == "numba":
+            loaded_row, loaded_col = (-1, -1) if self.loaded_place is None else self.loaded_place
+            commander_mask(self.grid, self.loading_priority, loaded_row, loaded_col, self.NO_STOCK,
+                           self.NEGATE_LOADED, mask, self.kernel_visited, self.kernel_queue)
+        elif self.loading_priority == self.NO_STOCK:
+            mask[:] = (self.grid > 0).reshape(-1)
+        else:
+            for row, col in self.reachability.reachable_cells(self.grid, self.loaded_place):
+                mask[row * self.n_col + col] = True
+            if not mask.any():
+                mask[self.loaded_place[0] * self.n_col + self.loaded_place[1]] = True
+        return mask
+
+    def step_info(self) -> dict:
+        """
+        :return: info of step and reset, with the action mask only if the env was made with mask_in_info=True
+        """
+        return {"action_mask": self.action_masks()} if self.mask_in_info else {}
+
+    def kernel_transition(self, row: int, col: int):
+        """
+        Same transition as transition(), run by the compiled kernel.
+        The kernel only updates the grid, so the priority index is synced here, with exactly the stocks the kernel
+        completed, and the reachability index is marked stale.
+        :return: reward
+        """
+        loaded_row, loaded_col = (-1, -1) if self.loaded_place is None else self.loaded_place
+        reward, loading_priority, _, _, n_completed = commander_step(
+            self.grid, row, col, self.loading_priority, loaded_row, loaded_col, self.NO_STOCK, self.NEGATE_LOADED,
+            self.loop_penalty, self.complete_reward, self.kernel_visited, self.kernel_queue)
+        if loading_priority != self.NO_STOCK:
+            if self.loading_priority == self.NO_STOCK:
+                self.loading_priority = int(loading_priority)
+                self.loaded_place = (row, col)
+                self.reachability.invalidate()
+        elif self.loading_priority != self.NO_STOCK:
+            self.priorities.move(self.loading_priority, (row, col))
+            self.loading_priority = self.NO_STOCK
+            self.loaded_place = None
+            self.reachability.invalidate()
+            if n_completed:
+                self.priorities.pop(n_completed)
+                self.n_stocks -= n_completed
+        return reward
+
+    def get_yard_state(self) -> yard.YardState:
+        """
+        Immutable snapshot of the yard for the pure transition functions of src.env.yard
+        """
+        ranks = self.grid.astype(np.int64)
+        loading = yard.NO_STOCK
+        if self.loaded_place is not None:
+            ranks[self.loaded_place] = yard.SRC_POSITION_MARKER
+            loading = int(self.loading_priority)
+        return yard.make_state(ranks, loading, self.loaded_place, self.n_steps)
+
+    def set_yard_state(self, state: yard.YardState):
+        """
+        Continue from a YardState, e.g. one reached by yard.transition
+        """
+        ranks = np.array(state.ranks)
+        self.loading_priority = self.NO_STOCK
+        self.loaded_place = None
+        if state.loading != yard.NO_STOCK:
+            self.loaded_place = (state.loaded_row, state.loaded_col)
+            ranks[self.loaded_place] = state.loading
+        self.priorities = PriorityIndex.from_ranks(ranks)
+        rows, cols, priorities = self.priorities.cells()
+        self.grid[:] = EMPTY_CELL
+        self.grid[rows, cols] = priorities
+        if self.loaded_place is not None:
+            self.loading_priority = int(self.grid[self.loaded_place])
+            self.grid[self.loaded_place] = self.loaded_marker(self.loading_priority)
+        self.grid_changed = True
+        self.reachability.invalidate()
+        self.n_stocks = state.n_stocks
+        self.n_steps = state.n_steps
+
+    def load_scenario(self, ranks: np.ndarray):
+        """
+        Place the stocks of a scenario bank yard on the empty grid
+        :param ranks: 2D array, priority rank of the stock in each cell and 0 for empty cells
+        """
+        self.priorities = PriorityIndex.from_ranks(ranks)
+        rows, cols, priorities = self.priorities.cells()
+        self.grid[rows, cols] = priorities
+        self.grid_changed = True
+        self.n_stocks = len(self.priorities)
+        self.reachability.invalidate()
+
+    def place_random_stocks(self, n_stocks: int):
+        if n_stocks > self.n_row * (self.n_col - 1):
+            raise ValueError("Too many stocks to place")
+        n_new = n_stocks - self.n_stocks
+        if n_new > 0:
+            free = self.grid == EMPTY_CELL
+            free[:, -1] = False
+            rows, cols = sample_cells(self.np_random, free, n_new)
+            # the new stocks go ahead of the existing ones, as if each was placed with priority 1
+            self.priorities.prepend(zip(rows.tolist(), cols.tolist()))
+            rows, cols, priorities = self.priorities.cells()
+            self.grid[rows, cols] = priorities
+            self.grid_changed = True
+            self.n_stocks += n_new
+            self.reachability.invalidate()
+
+        return self.observe()
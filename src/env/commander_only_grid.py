@@ -1,27 +1,61 @@
+import logging
+
 import gymnasium as gym
 import numpy as np
 
-from src.utils.grid import is_reachable
+from src.env.commander_common import EMPTY_CELL, SRC_POSITION_MARKER, CommanderMixin
+from src.utils.curriculum import SharedCurriculum
+from src.utils.grid import ReachabilityIndex
+from src.utils.kernels import make_buffers, resolve_backend
+from src.utils.priority import PriorityIndex
+from src.utils.scenario_bank import ScenarioBank
 
-EMPTY_CELL = 0
-SRC_POSITION_MARKER = -1
 NO_STOCK = -1
 
-
-class GridOnlyCommander(gym.Env):
-
-    def __init__(self, n_row: int = 5, n_col: int = 5):
-        self.grid = [[EMPTY_CELL for _ in range(n_col)] for _ in range(n_row)]
-        self.n_row = len(self.grid)
-        self.n_col = len(self.grid[0])
+logger = logging.getLogger(__name__)
+
+
+class GridOnlyCommander(CommanderMixin, gym.Env):
+    metadata = {"render_modes": ["human"]}
+    NO_STOCK = NO_STOCK
+    NEGATE_LOADED = True
+
+    def __init__(self, n_row: int = 5, n_col: int = 5, zero_copy: bool = False, render_mode: str = None,
+                 scenario_bank: str = None, backend: str = "auto", curriculum: SharedCurriculum = None,
+                 mask_in_info: bool = False):
+        """
+        :param n_row: number of rows
+        :param n_col: number of columns
+        :param zero_copy: if True, observe() returns a read-only view of the grid buffer instead of a copy.
+        The view changes on the next step, so copy it before keeping it around.
+        :param render_mode: None (no output) or "human" (print the grid on every reset and step)
+        :param scenario_bank: stem of a commander bank written by src.utils.scenario_bank.
+        If set, resets copy a stored yard with reset_n_stocks stocks instead of generating one.
+        :param backend: "python", "numba" (compiled step kernel from src.utils.kernels) or "auto" (numba if installed)
+        :param curriculum: stock count shared with env copies in other processes, see src.utils.curriculum.
+        If set, resets read reset_n_stocks from it and clears are counted there instead of in n_clear.
+        :param mask_in_info: if True, step and reset also return action_masks() as info["action_mask"].
+        Off by default since MaskablePPO calls action_masks() itself.
+        """
+        self.backend = resolve_backend(backend)
+        self.zero_copy = zero_copy
+        self.scenario_bank = None if scenario_bank is None else ScenarioBank(scenario_bank)
+        if self.scenario_bank is not None:
+            self.scenario_bank.check("commander", n_row, n_col)
+        self.render_mode = render_mode
+        # the engine works on integer ranks, observations scale them by priority_interval into (-1, 1)
+        self.priority_interval = 1 / (n_row * n_col)
+        self.n_row = n_row
+        self.n_col = n_col
+        self.set_grid(np.full((n_row, n_col), EMPTY_CELL, dtype=np.int16))
 
         self.action_space = gym.spaces.MultiDiscrete([n_row, n_col])
         self.observation_space = gym.spaces.Box(low=-1, high=1, shape=(1, n_row, n_col), dtype=np.float32)
 
         self.loading_priority = NO_STOCK
         self.loaded_place = None
+        self.reachability = ReachabilityIndex(self.n_row, self.n_col)
 
-        self.priority_interval = round(1 / (self.n_row * self.n_col), 2)
         self.n_stocks = 0
 
         self.max_steps = None
@@ -37,21 +71,41 @@ class GridOnlyCommander(gym.Env):
         self.n_clear = 0
         self.upgrade_interval = 1_000
 
+        self.curriculum = curriculum
+        self.curriculum_slot = None if curriculum is None else curriculum.attach()
+        self.mask_in_info = mask_in_info
+
     def print_grid(self):
+        self.refresh_grid_obs()
         for row in range(self.n_row):
             for col in range(self.n_col):
-                print(f'{self.grid[row][col]:.2f}', end='\t')
+                print(f'{self.grid_obs[0][row][col]:.2f}', end='\t')
             print()
 
+    def render(self):
+        if self.render_mode == "human":
+            self.print_grid()
+
     def set_grid(self, grid):
+        """
+        :param grid: 2D array of priority ranks, 0 for empty cells
+        """
         self.observation_space = gym.spaces.Box(low=-1, high=1, shape=(1, len(grid), len(grid[0])), dtype=np.float32)
-        self.grid = grid
+        self.grid = np.array(grid, dtype=np.int16)
+        # the scaled grid is the only channel of the observation buffer
+        self.grid_obs = np.empty((1,) + self.grid.shape, dtype=np.float32)
+        self.grid_obs_view = self.grid_obs.view()
+        self.grid_obs_view.flags.writeable = False
+        self.grid_changed = True
+        self.reachability = ReachabilityIndex(len(grid), len(grid[0]))
+        self.priorities = PriorityIndex.from_ranks(self.grid)
+        self.kernel_visited, self.kernel_queue = make_buffers(len(grid), len(grid[0]))
 
     def load_stock(self, row: int, col: int) -> bool:
         if self.loading_priority != NO_STOCK:
             return False
         if self.grid[row][col] > 0:
-            self.loading_priority = self.grid[row][col]
+            self.loading_priority = int(self.grid[row][col])
             self.grid[row][col] = -1 * self.loading_priority
             self.loaded_place = (row, col)
             return True
@@ -60,11 +114,14 @@ class GridOnlyCommander(gym.Env):
     def unload_stock(self, row: int, col: int) -> bool:
         if self.loading_priority == NO_STOCK:
             return False
-        if is_reachable(self.grid, self.loaded_place, (row, col)):
+        if self.reachability.is_reachable(self.grid, self.loaded_place, (row, col)):
             self.grid[row][col] = self.loading_priority
+            self.reachability.close(row, col)
+            self.priorities.move(self.loading_priority, (row, col))
             self.loading_priority = NO_STOCK
             if self.loaded_place != (row, col):
                 self.grid[self.loaded_place[0]][self.loaded_place[1]] = EMPTY_CELL
+                self.reachability.open(*self.loaded_place)
             self.loaded_place = None
             # print("================================")
             # self.print_grid()
@@ -72,110 +129,116 @@ class GridOnlyCommander(gym.Env):
         return False
 
     def place_object(self, row: int, col: int, priority: int):
-        if priority <= 1:
-            priority = 1
-        elif priority >= self.n_stocks + 1:
-            priority = self.n_stocks + 1
-        if self.n_stocks == 0:
-            self.n_stocks = 1
-            self.grid[row][col] = self.priority_interval
-        else:
-            for r in range(self.n_row):
-                for c in range(self.n_col):
-                    if self.grid[r][c] != EMPTY_CELL:
-                        if self.grid[r][c] / self.priority_interval >= priority:
-                            self.grid[r][c] += self.priority_interval
-            self.n_stocks += 1
-            self.grid[row][col] = priority * self.priority_interval
+        priority = self.priorities.insert(priority, (row, col))
+        rows, cols, priorities = self.priorities.cells(priority)
+        self.grid[rows, cols] = priorities
+        self.grid_changed = True
+        self.n_stocks += 1
+        self.reachability.close(row, col)
 
     def remove_object(self, row: int, col: int):
         self.n_stocks -= 1
         self.grid[row][col] = EMPTY_CELL
+        self.grid_changed = True
+        self.reachability.open(row, col)
         return self.complete_reward
 
-    def observe(self):
-        return np.array([self.grid])
+    def refresh_grid_obs(self):
+        """
+        Scale the ranks into the observation buffer, only if the grid changed since the last call.
+        The loaded place holds -rank, so it is scaled like the stocks.
+        """
+        if self.grid_changed:
+            np.multiply(self.grid, self.priority_interval, out=self.grid_obs[0])
+            self.grid_changed = False
 
-    def step(self, action: tuple) -> tuple:
-        if self.max_steps is not None and self.n_steps > self.max_steps:
-            return self.observe(), 0, True, True, {}
+    def observe(self):
+        self.refresh_grid_obs()
+        if self.zero_copy:
+            return self.grid_obs_view
+        return self.grid_obs.copy()
+
+    def transition(self, row: int, col: int):
+        """
+        Load or unload at (row, col), the reference implementation of the step logic
+        :return: reward
+        """
         reward = 0
         if self.loading_priority == NO_STOCK:
-            if self.load_stock(action[0], action[1]):
+            if self.load_stock(row, col):
                 pass
             else:
                 reward = self.loop_penalty
 
         else:
-            if (action[0], action[1]) == self.loaded_place:
+            if (row, col) == self.loaded_place:
                 reward = self.loop_penalty
-                self.unload_stock(action[0], action[1])
-            elif self.unload_stock(action[0], action[1]):
+                self.unload_stock(row, col)
+            elif self.unload_stock(row, col):
                 reward = self.check_complete()
             else:
                 reward = self.loop_penalty
+        return reward
+
+    def step(self, action: tuple) -> tuple:
+        if self.max_steps is not None and self.n_steps > self.max_steps:
+            return self.observe(), 0, True, True, self.step_info()
+        if self.backend == "numba":
+            reward = self.kernel_transition(action[0], action[1])
+        else:
+            reward = self.transition(action[0], action[1])
+        self.grid_changed = True
 
         self.n_steps += 1
         if self.n_stocks <= 0:
-            self.n_clear += 1
-            if self.n_clear % self.upgrade_interval == 0:
-                self.reset_n_stocks = min(self.reset_n_stocks + 1, self.final_n_stocks)
-                self.n_clear = 0
-        # print(self.observe())
-        return self.observe(), reward, self.n_stocks <= 0, False, {}
+            if self.curriculum is not None:
+                self.curriculum.record_clear(self.curriculum_slot)
+            else:
+                self.n_clear += 1
+                if self.n_clear % self.upgrade_interval == 0:
+                    self.reset_n_stocks = min(self.reset_n_stocks + 1, self.final_n_stocks)
+                    self.n_clear = 0
+        if self.render_mode == "human":
+            self.render()
+        return self.observe(), reward, self.n_stocks <= 0, False, self.step_info()
 
     def reset(self, *, seed=None, options=None):
+        super().reset(seed=seed)
+        if self.curriculum is not None:
+            self.reset_n_stocks = self.curriculum.n_stocks
         self.n_steps = 0
         self.n_stocks = 0
-        self.grid = [[EMPTY_CELL for _ in range(self.n_col)] for _ in range(self.n_row)]
-        self.place_random_stocks(self.reset_n_stocks)
+        self.grid[:] = EMPTY_CELL
+        self.grid_changed = True
+        self.loaded_place = None
+        self.priorities.clear()
+        self.reachability.invalidate()
+        if self.scenario_bank is None:
+            self.place_random_stocks(self.reset_n_stocks)
+        elif options is not None and "scenario" in options:
+            self.load_scenario(self.scenario_bank[options["scenario"]])
+        else:
+            self.load_scenario(self.scenario_bank.sample(self.np_random, self.reset_n_stocks))
         self.loading_priority = NO_STOCK
 
-        print("-------------------------")
-        print(f"reset | {self.reset_n_stocks}")
-        self.print_grid()
+        logger.debug("reset | %d", self.reset_n_stocks)
+        if self.render_mode == "human":
+            self.render()
 
-        return self.observe(), {}
+        return self.observe(), self.step_info()
 
     def check_complete(self):
-        complete_count = 0
-        row = 0
-        #         print(f"check complete | {self.complete_reward}")
-        while row < self.n_row:
-            # print(f"{self.grid[row][self.n_col - 1]}")
-            if round(self.grid[row][self.n_col - 1], 2) == round(self.priority_interval * (complete_count + 1), 2):
-                complete_count += 1
-                self.remove_object(row, self.n_col - 1)
-                # print(f"complete at {row}, {self.n_col - 1}, complete count: {complete_count}, remaining: {self.n_stocks}")
-                row = 0
-                continue
-            row += 1
-
-        for col in range(self.n_col):
-            for row in range(self.n_row):
-                if self.grid[row][col] != EMPTY_CELL:
-                    self.grid[row][col] -= self.priority_interval * complete_count
-        # if complete_count > 0:
-        # print(f"complete | {complete_count}")
-        # self.print_grid()
-        # print("-----")
-        return complete_count * self.complete_reward
-
-    def place_random_stocks(self, n_stocks: int):
-        if n_stocks > self.n_row * (self.n_col - 1):
-            raise ValueError("Too many stocks to place")
-        while self.n_stocks < n_stocks:
-            random_space = np.random.randint(0, self.n_row * (self.n_col - 1))
-            row = random_space // (self.n_col - 1)
-            col = random_space % (self.n_col - 1)
-            # print(f"{random_space}, {row}, {col}")
-            if self.grid[row][col] == EMPTY_CELL:
-                self.place_object(row, col, 1)
-
-        return self.observe()
+        completed = self.priorities.pop_completed(self.n_col - 1)
+        for row, col in completed:
+            self.remove_object(row, col)
+        if completed:
+            rows, cols, priorities = self.priorities.cells()
+            self.grid[rows, cols] = priorities
+        return len(completed) * self.complete_reward
 
 
 class CommanderWrapper(gym.Wrapper):
+
     def __init__(self, env):
         super().__init__(env)
         self.env = env
@@ -187,3 +250,6 @@ class CommanderWrapper(gym.Wrapper):
         col = action % self.n_col
         # print(f"action {action}: {src} -> {dst}")
         return self.env.step((row, col))
+
+    def action_masks(self):
+        return self.env.action_masks()
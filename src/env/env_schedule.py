@@ -0,0 +1,314 @@
+from collections import deque
+
+import gymnasium as gym
+import numpy as np
+
+from src.utils.events import ARRIVAL, DEPARTURE, EventQueue
+from src.utils.schedule import ENTER, EXIT, VALUE, random_schedule
+
+NO_STOCK = -1
+
+
+class ScheduleYard(gym.Env):
+    """
+    Time-based yard driven by an arrival/departure schedule, the working version of the commented-out StorageYard
+    of env_norm.py.
+
+    Stocks arrive at the gate at their enter time, or queue behind it while the gate is taken, and have to be back on
+    the gate at their exit time. A stock on the gate at its exit time leaves with its value as reward. A stock that
+    misses it leaves as soon as it is put on the gate, minus late_penalty per time unit of delay.
+
+    Time is simulated with a discrete-event queue. Every action takes a fixed duration and the clock jumps over it,
+    handling the arrivals and departures due on the way, WAIT jumps straight to the next event. Deadlines are
+    stored as absolute times and only turned into remaining times when an observation is built, so nothing is
+    decremented per time unit. The schedule is read lazily, lookahead rows ahead of the clock.
+    """
+    metadata = {"render_modes": ["human"]}
+    ACTION = {
+        0: (0, 1),  # right
+        1: (0, -1),  # left
+        2: (-1, 0),  # up
+        3: (1, 0),  # down
+    }
+    GET = 4
+    PUT = 5
+    WAIT = 6
+
+    def __init__(self, schedule=None, n_row: int = 10, n_col: int = 10, gate: tuple = None,
+                 time_move: float = 1.0, time_get: float = 1.0, time_put: float = 1.0, time_scale: float = None,
+                 lookahead: int = 8, late_penalty: float = 0.01, impossible_penalty: float = -1.0,
+                 render_mode: str = None):
+        """
+        :param schedule: iterable of (enter, exit, value) rows sorted by enter, iterated again on every reset.
+        If None, every reset draws a random schedule of n_stocks stocks over horizon time units.
+        :param gate: cell where stocks arrive and leave, the bottom-right cell by default
+        :param time_scale: remaining times are divided by it in observations, horizon by default
+        :param lookahead: number of upcoming arrivals in the observation
+        """
+        self.render_mode = render_mode
+        self.schedule = schedule
+        self.n_row = n_row
+        self.n_col = n_col
+        self.gate = (n_row - 1, n_col - 1) if gate is None else tuple(gate)
+        self.time_move = time_move
+        self.time_get = time_get
+        self.time_put = time_put
+        self.late_penalty = late_penalty
+        self.impossible_penalty = impossible_penalty
+        self.lookahead = lookahead
+
+        # random schedules
+        self.n_stocks = 4 * n_row * n_col
+        self.horizon = 100.0 * n_row * n_col
+        self.min_stay = 10.0 * (n_row + n_col)
+        self.max_stay = 40.0 * (n_row + n_col)
+        self.time_scale = self.horizon if time_scale is None else time_scale
+
+        self.action_space = gym.spaces.Discrete(7)
+        self.observation_space = gym.spaces.Dict({
+            "time_to_exit": gym.spaces.Box(low=-np.inf, high=np.inf, shape=(n_row, n_col)),
+            "value": gym.spaces.Box(low=-np.inf, high=np.inf, shape=(n_row, n_col)),
+            "occupied": gym.spaces.MultiBinary([n_row, n_col]),
+            "cart": gym.spaces.MultiDiscrete([n_row, n_col]),
+            # time to exit and value of the carried stock, zeros if the cart is empty
+            "holding": gym.spaces.Box(low=-np.inf, high=np.inf, shape=(2,)),
+            # time to enter, time to exit and value of the next arrivals, zero rows past the end of the schedule
+            "upcoming": gym.spaces.Box(low=-np.inf, high=np.inf, shape=(lookahead, 3)),
+            "n_waiting": gym.spaces.Box(low=0, high=np.inf, shape=(1,)),
+        })
+
+        self.stock_grid = np.full((n_row, n_col), NO_STOCK, dtype=np.int64)
+        self.deadline_grid = np.zeros((n_row, n_col), dtype=np.float64)
+        self.value_grid = np.zeros((n_row, n_col), dtype=np.float64)
+        # stock id -> [exit time, value] of the stocks in the yard, the waiting line and the cart
+        self.stocks = {}
+        self.overdue = set()
+        self.waiting = deque()
+        self.events = EventQueue()
+        self.rows = iter(())
+        self.upcoming = deque()
+        self.next_id = 0
+        self.last_enter = -np.inf
+
+        self.now = 0.0
+        self.cart = (0, 0)
+        self.holding = NO_STOCK
+        self.reward = 0.0
+        self.n_steps = 0
+        self.max_steps = None
+        self.n_departed = 0
+        self.n_late = 0
+
+    def reset(self, *, seed=None, options=None):
+        super().reset(seed=seed)
+        if self.schedule is None:
+            schedule = random_schedule(self.np_random, self.n_stocks, self.horizon, self.min_stay, self.max_stay)
+        else:
+            schedule = self.schedule
+        self.rows = iter(schedule)
+        self.upcoming.clear()
+        self.next_id = 0
+        self.last_enter = -np.inf
+
+        self.stock_grid[:] = NO_STOCK
+        self.deadline_grid[:] = 0
+        self.value_grid[:] = 0
+        self.stocks.clear()
+        self.overdue.clear()
+        self.waiting.clear()
+        self.events.clear()
+
+        self.now = 0.0
+        self.cart = (0, 0)
+        self.holding = NO_STOCK
+        self.reward = 0.0
+        self.n_steps = 0
+        self.n_departed = 0
+        self.n_late = 0
+
+        self.pull_rows()
+        self.schedule_next_arrival()
+        # stocks entering at time 0 are already there
+        self.advance(0.0)
+        if self.render_mode == "human":
+            self.render()
+        return self.observe(), {}
+
+    def pull_rows(self):
+        """
+        Read the schedule until lookahead rows are buffered, each row gets the next stock id
+        """
+        while len(self.upcoming) < self.lookahead:
+            row = next(self.rows, None)
+            if row is None:
+                return
+            enter, exit_time, value = float(row[ENTER]), float(row[EXIT]), float(row[VALUE])
+            if enter < self.last_enter:
+                raise ValueError(f"Schedule is not sorted by enter time at stock {self.next_id}")
+            self.last_enter = enter
+            self.upcoming.append((self.next_id, enter, exit_time, value))
+            self.next_id += 1
+
+    def schedule_next_arrival(self):
+        if self.upcoming:
+            stock, enter, _, _ = self.upcoming[0]
+            self.events.push(enter, ARRIVAL, stock)
+
+    def advance(self, duration: float):
+        """
+        Move the clock duration forward, handling the events due on the way
+        """
+        until = self.now + duration
+        while self.events.next_time() <= until:
+            time, kind, stock = self.events.pop()
+            self.now = time
+            if kind == ARRIVAL:
+                self.arrive(stock)
+            else:
+                self.due(stock)
+        self.now = until
+
+    def arrive(self, stock: int):
+        _, _, exit_time, value = self.upcoming.popleft()
+        self.stocks[stock] = [exit_time, value]
+        self.events.push(exit_time, DEPARTURE, stock)
+        self.waiting.append(stock)
+        self.fill_gate()
+        self.pull_rows()
+        self.schedule_next_arrival()
+
+    def due(self, stock: int):
+        if self.stock_grid[self.gate] == stock:
+            self.depart(stock)
+            self.fill_gate()
+        else:
+            self.overdue.add(stock)
+
+    def depart(self, stock: int):
+        exit_time, value = self.stocks.pop(stock)
+        self.remove(self.gate)
+        delay = self.now - exit_time
+        if stock in self.overdue:
+            self.overdue.discard(stock)
+            self.n_late += 1
+            value -= self.late_penalty * delay
+        self.reward += value
+        self.n_departed += 1
+
+    def fill_gate(self):
+        """
+        Move waiting stocks onto the free gate, overdue ones leave right away
+        """
+        while self.waiting and self.stock_grid[self.gate] == NO_STOCK:
+            stock = self.waiting.popleft()
+            self.place(self.gate, stock)
+            if stock in self.overdue:
+                self.depart(stock)
+
+    def place(self, cell: tuple, stock: int):
+        exit_time, value = self.stocks[stock]
+        self.stock_grid[cell] = stock
+        self.deadline_grid[cell] = exit_time
+        self.value_grid[cell] = value
+
+    def remove(self, cell: tuple) -> int:
+        stock = int(self.stock_grid[cell])
+        self.stock_grid[cell] = NO_STOCK
+        self.deadline_grid[cell] = 0
+        self.value_grid[cell] = 0
+        return stock
+
+    def move(self, action: int) -> bool:
+        row = self.cart[0] + self.ACTION[action][0]
+        col = self.cart[1] + self.ACTION[action][1]
+        if not (0 <= row < self.n_row and 0 <= col < self.n_col):
+            return False
+        # a loaded cart can not drive under another stock
+        if self.holding != NO_STOCK and self.stock_grid[row, col] != NO_STOCK:
+            return False
+        self.cart = (row, col)
+        return True
+
+    def get(self) -> bool:
+        if self.holding != NO_STOCK or self.stock_grid[self.cart] == NO_STOCK:
+            return False
+        self.holding = self.remove(self.cart)
+        if self.cart == self.gate:
+            self.fill_gate()
+        return True
+
+    def put(self) -> bool:
+        if self.holding == NO_STOCK or self.stock_grid[self.cart] != NO_STOCK:
+            return False
+        self.place(self.cart, self.holding)
+        self.holding = NO_STOCK
+        if self.cart == self.gate and self.stock_grid[self.gate] in self.overdue:
+            self.depart(int(self.stock_grid[self.gate]))
+            self.fill_gate()
+        return True
+
+    @property
+    def finished(self) -> bool:
+        return not self.upcoming and not self.stocks
+
+    def step(self, action):
+        self.n_steps += 1
+        self.reward = 0.0
+        if action == self.WAIT:
+            if self.events.next_time() < np.inf:
+                self.advance(self.events.next_time() - self.now)
+        elif action == self.GET:
+            if not self.get():
+                self.reward += self.impossible_penalty
+            self.advance(self.time_get)
+        elif action == self.PUT:
+            if not self.put():
+                self.reward += self.impossible_penalty
+            self.advance(self.time_put)
+        else:
+            if not self.move(action):
+                self.reward += self.impossible_penalty
+            self.advance(self.time_move)
+
+        truncated = self.max_steps is not None and self.n_steps >= self.max_steps
+        if self.render_mode == "human":
+            self.render()
+        return self.observe(), self.reward, self.finished, truncated, {"time": self.now}
+
+    def observe(self):
+        occupied = self.stock_grid != NO_STOCK
+        time_to_exit = np.where(occupied, (self.deadline_grid - self.now) / self.time_scale, 0)
+        holding = np.zeros(2, dtype=np.float32)
+        if self.holding != NO_STOCK:
+            exit_time, value = self.stocks[self.holding]
+            holding[:] = (exit_time - self.now) / self.time_scale, value
+        upcoming = np.zeros((self.lookahead, 3), dtype=np.float32)
+        for i, (_, enter, exit_time, value) in enumerate(self.upcoming):
+            upcoming[i] = (enter - self.now) / self.time_scale, (exit_time - self.now) / self.time_scale, value
+        return {
+            "time_to_exit": time_to_exit.astype(np.float32),
+            "value": self.value_grid.astype(np.float32),
+            "occupied": occupied.astype(np.int8),
+            "cart": np.array(self.cart),
+            "holding": holding,
+            "upcoming": upcoming,
+            "n_waiting": np.array([len(self.waiting)], dtype=np.float32),
+        }
+
+    def render(self):
+        if self.render_mode == "human":
+            self.print_grid()
+
+    def print_grid(self):
+        print(f"time {self.now:.1f} | waiting {len(self.waiting)} | departed {self.n_departed} (late {self.n_late})")
+        for row in range(self.n_row):
+            for col in range(self.n_col):
+                if (row, col) == self.cart:
+                    print('C' if self.holding == NO_STOCK else 'L', end='')
+                elif self.stock_grid[row, col] != NO_STOCK:
+                    print('■', end='')
+                elif (row, col) == self.gate:
+                    print('G', end='')
+                else:
+                    print('□', end='')
+            print()
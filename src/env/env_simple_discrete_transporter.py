@@ -1,6 +1,14 @@
+import logging
+
 import gymnasium as gym
 import numpy as np
 
+from src.utils.bitboard import Bitboard
+from src.utils.curriculum import SharedCurriculum
+from src.utils.grid import sample_cells
+from src.utils.scenario_bank import ScenarioBank
+from src.utils.shaping import DistanceShaping
+
 MAX_GRID_SIZE = 5
 EMPTY_CELL = 0
 STOCK_CELL = 1
@@ -13,8 +21,11 @@ SYMBOL = {
     TARGET_CELL: '▣'
 }
 
+logger = logging.getLogger(__name__)
+
 
 class SimpleTransporter(gym.Env):
+    metadata = {"render_modes": ["human"]}
     ACTION = {
         0: (0, 1),  # right
         1: (0, -1),  # left
@@ -23,8 +34,19 @@ class SimpleTransporter(gym.Env):
         4: (0, 0)  # put/unput
     }
 
-    def __init__(self, n_row: int = 4, n_col: int = 4, max_steps: int = 2000, loop_penalty: float = 0.0, init_n_stocks=10):
-        self.grid = np.array([[EMPTY_CELL for _ in range(n_col)] for _ in range(n_row)])
+    def __init__(self, n_row: int = 4, n_col: int = 4, max_steps: int = 2000, loop_penalty: float = 0.0, init_n_stocks=10, render_mode: str = None,
+                 scenario_bank: str = None, shaping: bool = False, curriculum: SharedCurriculum = None):
+        self.render_mode = render_mode
+        # stocks (the target included) are a bitboard, grid unpacks it into cell codes when it is read
+        self.board = Bitboard(n_row, n_col)
+        self.stocks = 0
+        self.cached_grid = None
+        # get_state buffer size: the bitboard words and 10 scalars
+        self.state_size = (n_row * n_col + 63) // 64 + 10
+        # stem of a transporter bank written by src.utils.scenario_bank, resets copy a stored yard if set
+        self.scenario_bank = None if scenario_bank is None else ScenarioBank(scenario_bank)
+        if self.scenario_bank is not None:
+            self.scenario_bank.check("transporter", n_row, n_col)
 
         self.action_space = gym.spaces.Discrete(5)
         self.observation_space = gym.spaces.Dict({
@@ -57,13 +79,38 @@ class SimpleTransporter(gym.Env):
         self.n_clear: int = 0
 
         self.upgrade_interval: int = 500
+        # stock count shared with env copies in other processes, replaces n_clear and upgrade_interval if set
+        self.curriculum = curriculum
+        self.curriculum_slot = None if curriculum is None else curriculum.attach()
+
+        # potential-based shaping on the target's distance to the last column, see src.utils.shaping
+        self.shaping = DistanceShaping(n_row, n_col) if shaping else None
+
+    @property
+    def grid(self) -> np.ndarray:
+        """
+        2D array of cell codes, rebuilt from the bitboard only after the stocks changed
+        """
+        if self.cached_grid is None:
+            self.cached_grid = self.board.unpack(self.stocks).astype(np.int64)
+            if self.target_position[0] >= 0 and self.board.test(self.stocks, *self.target_position):
+                self.cached_grid[self.target_position] = TARGET_CELL
+        return self.cached_grid
+
+    def set_stocks(self, stocks: int):
+        self.stocks = stocks
+        self.cached_grid = None
 
     def clear_grid(self):
-        self.grid = np.array([[EMPTY_CELL for _ in range(self.n_col)] for _ in range(self.n_row)])
+        self.set_stocks(0)
         self.n_stocks = 0
 
     def set_grid(self, grid):
-        self.grid = grid
+        grid = np.asarray(grid)
+        targets = np.argwhere(grid == TARGET_CELL)
+        if len(targets):
+            self.target_position = (int(targets[0][0]), int(targets[0][1]))
+        self.set_stocks(self.board.pack(grid))
 
     def print_state(self):
         for row in range(self.n_row):
@@ -81,26 +128,74 @@ class SimpleTransporter(gym.Env):
             print(f"loading : None")
         print(f"{'-' * 10}")
 
+    def render(self):
+        if self.render_mode == "human":
+            self.print_state()
+
+    def get_state(self, out: np.ndarray = None) -> np.ndarray:
+        """
+        Snapshot of the yard in a flat buffer: the stock bitboard as 64-bit words, then the target, current and last
+        positions, is_load, just_loaded, n_stocks and n_steps. Pass out to reuse a buffer instead of allocating one.
+        :param out: 1D int64 array of size state_size
+        :return: out
+        """
+        if out is None:
+            out = np.empty(self.state_size, dtype=np.int64)
+        n_words = self.state_size - 10
+        out[:n_words] = np.frombuffer(self.stocks.to_bytes(8 * n_words, "little"), dtype=np.int64)
+        out[n_words:] = (*self.target_position, *self.current_position, *self.last_position,
+                         self.is_load, self.just_loaded, self.n_stocks, self.n_steps)
+        return out
+
+    def set_state(self, state: np.ndarray):
+        """
+        Restore a snapshot taken by get_state
+        :param state: 1D int64 array
+        """
+        n_words = self.state_size - 10
+        self.set_stocks(int.from_bytes(state[:n_words].tobytes(), "little"))
+        (target_row, target_col, current_row, current_col, last_row, last_col,
+         is_load, just_loaded, self.n_stocks, self.n_steps) = state[n_words:].tolist()
+        self.target_position = (target_row, target_col)
+        self.current_position = (current_row, current_col)
+        self.last_position = (last_row, last_col)
+        self.is_load = bool(is_load)
+        self.just_loaded = bool(just_loaded)
+
+    def load_scenario(self, grid: np.ndarray):
+        """
+        Copy a scenario bank yard into the grid
+        :param grid: 2D array of cell codes with exactly one TARGET_CELL
+        """
+        self.set_grid(grid)
+        self.n_stocks = self.board.count(self.stocks)
+
     def place_object(self, row: int, col: int) -> bool:
-        if self.grid[row][col] == EMPTY_CELL:
-            self.grid[row][col] = STOCK_CELL
+        if not self.is_stock(row, col):
+            self.set_stocks(self.stocks | self.board.bit(row, col))
             self.n_stocks += 1
             return True
         return False
 
     def set_target(self, row: int, col: int):
         self.target_position = (row, col)
-        if self.grid[row][col] == EMPTY_CELL:
+        if not self.is_stock(row, col):
             self.n_stocks += 1
-        self.grid[row][col] = TARGET_CELL
+        self.set_stocks(self.stocks | self.board.bit(row, col))
 
     def remove_object(self, row: int, col: int) -> bool:
-        if self.grid[row][col] != EMPTY_CELL:
+        if self.is_stock(row, col):
             self.n_stocks -= 1
-            self.grid[row][col] = EMPTY_CELL
+            self.set_stocks(self.stocks & ~self.board.bit(row, col))
             return True
         return False
 
+    def target_obstacles(self) -> int:
+        """
+        Bitboard of the stocks the target has to go around
+        """
+        return self.stocks & ~self.board.bit(*self.target_position)
+
     def check_complete(self) -> bool:
         """
         check if target is placed on the last column
@@ -118,10 +213,10 @@ class SimpleTransporter(gym.Env):
             self.is_load = False
 
         # load
-        elif self.grid[self.current_position] != EMPTY_CELL:
+        elif self.is_stock(*self.current_position):
             self.is_load = True
 
-        elif self.grid[self.current_position] == EMPTY_CELL:
+        else:
             return self.loop_penalty
 
         if self.just_loaded:
@@ -132,7 +227,7 @@ class SimpleTransporter(gym.Env):
         self.current_position = [position_row, position_col]
 
     def is_stock(self, row: int, col: int) -> bool:
-        return self.grid[row][col] != EMPTY_CELL
+        return self.board.test(self.stocks, row, col)
 
     def move(self, direction: int) -> float:
         """
@@ -156,8 +251,13 @@ class SimpleTransporter(gym.Env):
 
         # 화물을 들고 있다면, 화물을 옮긴다. grid수정
         elif self.is_load:
-            self.grid[next_position] = self.grid[self.current_position]
-            self.grid[self.current_position] = EMPTY_CELL
+            self.stocks = self.stocks & ~self.board.bit(*self.current_position) | self.board.bit(*next_position)
+            if self.cached_grid is not None:
+                # moving one code is cheaper than unpacking, but earlier observations still hold the old array
+                grid = self.cached_grid.copy()
+                grid[next_position] = grid[self.current_position]
+                grid[self.current_position] = EMPTY_CELL
+                self.cached_grid = grid
 
             # 옮긴 화물이 타겟이라면, 타겟을 이동
             if self.current_position == self.target_position:
@@ -176,26 +276,35 @@ class SimpleTransporter(gym.Env):
 
     def step(self, action):
         self.n_steps += 1
-        if self.n_steps > 1000:
-            if self.n_steps % 1000 == 0:
-                self.print_state()
+        if self.n_steps % 1000 == 0:
+            logger.debug("step %d | stocks %d", self.n_steps, self.n_stocks)
         if self.n_steps >= self.max_steps:
             return self.observe(), 0, True, True, {}
+        done = False
         if action == 4:
             reward = self.toggle_load()
             self.just_loaded = True
-            return self.observe(), reward, False, False, {}
         else:
             self.just_loaded = False
             reward = self.move(action)
-            is_complete = self.check_complete()
-            if is_complete:
-                self.n_clear += 1
-                return self.observe(), self.complete_reward, True, False, {}
-            return self.observe(), reward, False, False, {}
+            if self.check_complete():
+                if self.curriculum is not None:
+                    self.curriculum.record_clear(self.curriculum_slot)
+                else:
+                    self.n_clear += 1
+                reward = self.complete_reward
+                done = True
+        if self.shaping is not None:
+            reward += self.shaping.shape(self.target_obstacles(), *self.target_position, done)
+        if self.render_mode == "human":
+            self.render()
+        return self.observe(), reward, done, False, {}
 
     def reset(self, *, seed=None, options=None):
-        if self.n_clear > 0 and self.n_clear % self.upgrade_interval == 0:
+        super().reset(seed=seed)
+        if self.curriculum is not None:
+            self.init_n_stocks = min(self.curriculum.n_stocks, self.max_n_stocks)
+        elif self.n_clear > 0 and self.n_clear % self.upgrade_interval == 0:
             self.init_n_stocks = min(self.init_n_stocks + 1, self.max_n_stocks)
             self.n_clear = 0
 
@@ -206,17 +315,23 @@ class SimpleTransporter(gym.Env):
         self.just_loaded = False
         self.current_position = (self.n_row // 2, self.n_col - 1)
 
-        random_location = np.random.randint(0, self.n_row * (self.n_col - 1))
-        row = random_location // (self.n_col - 1)
-        col = random_location % (self.n_col - 1)
-        self.set_target(row, col)
-        self.n_stocks = 1
+        if self.scenario_bank is None:
+            # the last column is kept free, the first picked cell holds the target
+            stock_area = np.ones((self.n_row, self.n_col), dtype=bool)
+            stock_area[:, -1] = False
+            rows, cols = sample_cells(self.np_random, stock_area, max(self.init_n_stocks, 1))
+            self.set_stocks(self.board.pack_cells(rows, cols))
+            self.set_target(int(rows[0]), int(cols[0]))
+            self.n_stocks = len(rows)
+        elif options is not None and "scenario" in options:
+            self.load_scenario(self.scenario_bank[options["scenario"]])
+        else:
+            self.load_scenario(self.scenario_bank.sample(self.np_random, max(self.init_n_stocks, 1)))
 
-        while self.n_stocks < self.init_n_stocks:
-            random_location = np.random.randint(0, self.n_row * (self.n_col - 1))
-            row = random_location // (self.n_col - 1)
-            col = random_location % (self.n_col - 1)
-            if self.grid[row][col] == EMPTY_CELL:
-                self.place_object(row, col)
+        if self.shaping is not None:
+            self.shaping.reset(self.target_obstacles(), *self.target_position)
 
+        logger.debug("reset | %d", self.init_n_stocks)
+        if self.render_mode == "human":
+            self.render()
         return self.observe(), {}
@@ -1,13 +1,35 @@
+from functools import lru_cache
+
 import gymnasium as gym
 import numpy as np
 
+from src.utils.grid import sample_cells
+from src.utils.shaping import DistanceShaping
+from src.utils.priority import PriorityIndex
+
 MAX_GRID_SIZE = 5
 STUCK_CELL = -2
 EMPTY_CELL = -1.0
 CURRENT_CELL = -1
+NO_STOCK = 0
+
+
+@lru_cache(maxsize=None)
+def padded_grids(max_shape: tuple, n_row: int, n_col: int) -> tuple:
+    """
+    Empty engine grid and grid_obs of an n_row x n_col yard padded to max_shape, shared by all envs of that size
+    :return: (int16 grid, float64 grid_obs), read-only
+    """
+    grid = np.full(max_shape, STUCK_CELL, dtype=np.int16)
+    grid[:n_row, :n_col] = NO_STOCK
+    grid_obs = np.where(grid == STUCK_CELL, STUCK_CELL, EMPTY_CELL)
+    grid.flags.writeable = False
+    grid_obs.flags.writeable = False
+    return grid, grid_obs
 
 
 class StorageYard(gym.Env):
+    metadata = {"render_modes": ["human"]}
     ACTION = {
         0: (0, 1),  # right
         1: (0, -1),  # left
@@ -16,14 +38,31 @@ class StorageYard(gym.Env):
         4: (0, 0)  # put/unput
     }
 
-    def __init__(self, n_row: int = 5, n_col: int = 5):
-        self.grid = np.array([[EMPTY_CELL for _ in range(MAX_GRID_SIZE)] for _ in range(MAX_GRID_SIZE)])
+    def __init__(self, n_row: int = 5, n_col: int = 5, render_mode: str = None, shaping: bool = False,
+                 max_size=MAX_GRID_SIZE, zero_copy: bool = False):
+        """
+        :param max_size: int or (rows, cols), observations are padded with STUCK_CELL to this shape, so yards of
+        different sizes up to it share one observation space
+        :param zero_copy: if True, observe() returns a read-only view of the grid_obs buffer instead of a copy.
+        The view changes on the next step or reset, so copy it before keeping it around.
+        """
+        self.render_mode = render_mode
+        self.zero_copy = zero_copy
+        self.max_shape = (max_size, max_size) if np.isscalar(max_size) else tuple(max_size)
+        self.check_size(n_row, n_col)
+        # the engine grid holds priority ranks, NO_STOCK and STUCK_CELL; observe() turns it into grid_obs,
+        # where stocks are scaled by priority_interval and empty cells are EMPTY_CELL
+        self.grid = np.full(self.max_shape, NO_STOCK, dtype=np.int16)
+        self.grid_obs = np.full(self.max_shape, EMPTY_CELL)
+        self.grid_obs_view = self.grid_obs.view()
+        self.grid_obs_view.flags.writeable = False
+        self.grid_changed = True
 
         self.action_space = gym.spaces.Discrete(5)
         self.observation_space = gym.spaces.Dict({
-            'stock-info': gym.spaces.Box(low=-1, high=1, shape=(MAX_GRID_SIZE, MAX_GRID_SIZE)),
-            'position': gym.spaces.MultiDiscrete([MAX_GRID_SIZE, MAX_GRID_SIZE]),
-            'load': gym.spaces.MultiBinary([1]),
+            'stock-info': gym.spaces.Box(low=-2, high=1, shape=self.max_shape),
+            'position': gym.spaces.MultiDiscrete(list(self.max_shape)),
+            'load': gym.spaces.Box(low=0, high=1, shape=(1,)),
             'priority_interval': gym.spaces.Box(low=0, high=1, shape=(1,))
         })
 
@@ -34,7 +73,7 @@ class StorageYard(gym.Env):
         self.c_col = 0
         self.last_position = [0, 0]
         self.is_load = False
-        self.loading_priority = 0
+        self.loading_priority = NO_STOCK
         self.just_loaded = False
 
         self.shrink_map()
@@ -43,95 +82,124 @@ class StorageYard(gym.Env):
         self.max_steps = 1_000_000
         self.n_stocks = 0
         self.priority_interval = 1 / (self.n_row * self.n_col)
+        self.priorities = PriorityIndex()
 
         self.loop_penalty = -0.0
         self.complete_reward = 1
 
         self.init_n_stocks = 5
 
+        # potential-based shaping on the distance of the priority 1 stock to the last column, see src.utils.shaping
+        self.shaping = DistanceShaping(n_row, n_col) if shaping else None
+        self.goal_obstacles = 0
+
     def set_grid(self, grid):
-        self.grid = grid
+        """
+        :param grid: max_shape array of priority ranks, NO_STOCK for empty cells
+        and STUCK_CELL outside the yard
+        """
+        self.grid = np.array(grid, dtype=np.int16)
+        self.grid_changed = True
+        self.priorities = PriorityIndex.from_ranks(self.grid)
+
+    def check_size(self, n_row: int, n_col: int):
+        if not (0 < n_row <= self.max_shape[0] and 0 < n_col <= self.max_shape[1]):
+            raise ValueError(f"A {n_row}x{n_col} yard does not fit in max_size {self.max_shape}")
 
     def shrink_map(self):
-        for row in range(MAX_GRID_SIZE):
-            for col in range(MAX_GRID_SIZE):
-                if row < self.n_row and col < self.n_col:
-                    self.grid[row][col] = EMPTY_CELL
-                else:
-                    self.grid[row][col] = STUCK_CELL
+        np.copyto(self.grid, padded_grids(self.max_shape, self.n_row, self.n_col)[0])
+        self.grid_changed = True
+
+    def refresh_grid_obs(self):
+        """
+        Rebuild grid_obs from the ranks, only if the grid changed since the last call
+        """
+        if not self.grid_changed:
+            return
+        np.copyto(self.grid_obs, padded_grids(self.max_shape, self.n_row, self.n_col)[1])
+        np.multiply(self.grid, self.priority_interval, out=self.grid_obs, where=self.grid > 0)
+        self.grid_changed = False
 
     def print_whole_grid(self):
-        for row in range(MAX_GRID_SIZE):
-            for col in range(MAX_GRID_SIZE):
-                print(self.grid[row][col], end='\t')
+        self.refresh_grid_obs()
+        for row in range(self.max_shape[0]):
+            for col in range(self.max_shape[1]):
+                print(self.grid_obs[row][col], end='\t')
             print()
 
     def print_grid(self):
+        self.refresh_grid_obs()
         for row in range(self.n_row):
             for col in range(self.n_col):
                 if row == self.c_row and col == self.c_col:
                     print('TTTT', end='\t')
                 else:
                     # 소수점 둘째 자리까지 출력
-                    print(f'{self.grid[row][col]:.2f}', end='\t')
+                    print(f'{self.grid_obs[row][col]:.2f}', end='\t')
             print()
 
+    def render(self):
+        if self.render_mode == "human":
+            self.print_grid()
+
     def reset_size(self, n_row: int, n_col: int):
+        self.check_size(n_row, n_col)
         self.n_row = n_row
         self.n_col = n_col
+        self.priority_interval = 1 / (n_row * n_col)
         self.shrink_map()
+        # shrink_map empties the yard, so the stocks and the loaded one are gone
+        self.priorities.clear()
+        self.n_stocks = 0
+        self.is_load = False
+        self.loading_priority = NO_STOCK
+        if self.shaping is not None:
+            self.shaping = DistanceShaping(n_row, n_col, self.shaping.gamma, self.shaping.scale)
 
     def place_object(self, row: int, col: int, priority: int):
-        if priority <= 1:
-            priority = 1
-        elif priority >= self.n_stocks + 1:
-            priority = self.n_stocks + 1
-        if self.n_stocks == 0:
-            self.n_stocks = 1
-            self.grid[row][col] = self.priority_interval
-        else:
-            for r in range(self.n_row):
-                for c in range(self.n_col):
-                    if self.grid[r][c] != EMPTY_CELL:
-                        if self.grid[r][c] / self.priority_interval >= priority:
-                            self.grid[r][c] += self.priority_interval
-            self.n_stocks += 1
-            self.grid[row][col] = priority * self.priority_interval
-        self.print_grid()
+        priority = self.priorities.insert(priority, (row, col))
+        rows, cols, priorities = self.priorities.cells(priority)
+        self.grid[rows, cols] = priorities
+        self.grid_changed = True
+        self.n_stocks += 1
 
     def remove_object(self, row: int, col: int):
         self.n_stocks -= 1
-        self.grid[row][col] = EMPTY_CELL
+        self.grid[row][col] = NO_STOCK
+        self.grid_changed = True
         return self.complete_reward
 
     def check_complete(self):
-        complete_count = 0
-        row = 0
-        while row < self.n_row:
-            if self.grid[row][self.n_col - 1] == self.priority_interval * (complete_count + 1):
-                self.remove_object(row, self.n_col - 1)
-                # print(f"complete at {row}, {self.n_col - 1}, complete count: {complete_count}")
-                complete_count += 1
-                row = 0
-            row += 1
-
-        for col in range(self.n_col):
-            for row in range(self.n_row):
-                if self.grid[row][col] != EMPTY_CELL:
-                    self.grid[row][col] -= self.priority_interval * complete_count
-        return complete_count * self.complete_reward
+        completed = self.priorities.pop_completed(self.n_col - 1)
+        for row, col in completed:
+            self.remove_object(row, col)
+        if completed:
+            rows, cols, priorities = self.priorities.cells()
+            self.grid[rows, cols] = priorities
+        return len(completed) * self.complete_reward
+
+    def goal_position(self) -> tuple:
+        return self.priorities.position(1) if self.priorities.positions else (0, 0)
+
+    def update_goal_obstacles(self):
+        """
+        Bitboard of the stocks the priority 1 stock has to go around
+        """
+        board = self.shaping.board
+        stocks = board.pack(self.grid[:self.n_row, :self.n_col] > 0)
+        self.goal_obstacles = stocks & ~board.bit(*self.goal_position())
 
     def toggle_load(self):
         # unload
         if self.is_load:
-            self.loading_priority = 0
+            self.loading_priority = NO_STOCK
             self.is_load = False
             # print(f"unload at {self.c_row}, {self.c_col}, {self.priority_interval}")
-            if self.grid[self.c_row][self.c_col] == self.priority_interval:
+            if self.priorities.positions and self.priorities.position(1) == (self.c_row, self.c_col):
                 return self.check_complete()
         # load
-        elif self.grid[self.c_row][self.c_col] != EMPTY_CELL:
-            self.loading_priority = self.grid[self.c_row][self.c_col]
+        elif self.grid[self.c_row][self.c_col] != NO_STOCK:
+            self.loading_priority = int(self.grid[self.c_row][self.c_col])
             self.is_load = True
 
         if self.just_loaded:
@@ -150,11 +218,13 @@ class StorageYard(gym.Env):
         next_position = [next_row, next_col]
 
         # 화물 밑에서는 다른 화물 밑으로 이동할 수 없다.
-        if self.grid[self.c_row][self.c_col] != EMPTY_CELL and self.grid[next_position[0]][next_position[1]] != EMPTY_CELL:
+        if self.grid[self.c_row][self.c_col] != NO_STOCK and self.grid[next_position[0]][next_position[1]] != NO_STOCK:
             return self.loop_penalty
         elif self.is_load:
             self.grid[next_position[0]][next_position[1]] = self.grid[self.c_row][self.c_col]
-            self.grid[self.c_row][self.c_col] = EMPTY_CELL
+            self.grid[self.c_row][self.c_col] = NO_STOCK
+            self.grid_changed = True
+            self.priorities.move(self.loading_priority, tuple(next_position))
 
         if next_position == [self.c_row, self.c_col]:
             return self.loop_penalty
@@ -163,11 +233,12 @@ class StorageYard(gym.Env):
         return 0
 
     def observe(self):
+        self.refresh_grid_obs()
         return {
-            'stock-info': self.grid,
+            'stock-info': self.grid_obs_view if self.zero_copy else self.grid_obs.copy(),
             'position': [self.c_row, self.c_col],
             # 'last_position': self.last_position,
-            'load': [self.loading_priority],
+            'load': [self.loading_priority * self.priority_interval],
             'priority_interval': [self.priority_interval]
         }
 
@@ -178,26 +249,42 @@ class StorageYard(gym.Env):
         if action == 4:
             reward = self.toggle_load()
             self.just_loaded = True
-            if self.n_stocks == 0:
-                return self.observe(), reward, True, False, {}
-            return self.observe(), reward, False, False, {}
+            done = self.n_stocks == 0
         else:
             reward = self.move(action)
             self.just_loaded = False
-            return self.observe(), reward, False, False, {}
+            done = False
+        if self.shaping is not None:
+            # stocks only move while loaded or when they complete
+            if self.is_load or action == 4:
+                self.update_goal_obstacles()
+            reward += self.shaping.shape(self.goal_obstacles, *self.goal_position(), done)
+        if self.render_mode == "human":
+            self.render()
+        return self.observe(), reward, done, False, {}
 
     def reset(self, *, seed=None, options=None):
+        super().reset(seed=seed)
         self.n_steps = 0
         self.c_row = 0
         self.c_col = 0
         self.is_load = False
-        self.loading_priority = 0
+        self.loading_priority = NO_STOCK
         self.just_loaded = False
-        while self.n_stocks < self.init_n_stocks:
-            random_space = np.random.randint(0, self.n_row * self.n_col)
-            row = random_space // self.n_col
-            col = random_space % self.n_col
-            if self.grid[row][col] == EMPTY_CELL:
-                self.place_object(row, col, 1)
+        n_new = self.init_n_stocks - self.n_stocks
+        if n_new > 0:
+            free = self.grid[:self.n_row, :self.n_col] == NO_STOCK
+            rows, cols = sample_cells(self.np_random, free, n_new)
+            # the new stocks go ahead of the existing ones, as if each was placed with priority 1
+            self.priorities.prepend(zip(rows.tolist(), cols.tolist()))
+            rows, cols, priorities = self.priorities.cells()
+            self.grid[rows, cols] = priorities
+            self.grid_changed = True
+            self.n_stocks += n_new
 
+        if self.shaping is not None:
+            self.update_goal_obstacles()
+            self.shaping.reset(self.goal_obstacles, *self.goal_position())
+        if self.render_mode == "human":
+            self.render()
         return self.observe(), {}
@@ -2,10 +2,15 @@ import gymnasium as gym
 import gymnasium.spaces as spaces
 import numpy as np
 
-from src.utils.grid import generate_random_map
+from src.utils.bitboard import Bitboard
+from src.utils.grid import generate_random_maps
+from src.utils.scenario_bank import ScenarioBank
+
+MAP_POOL_SIZE = 64
 
 
 class Maze(gym.Env):
+    metadata = {"render_modes": ["human"]}
     ACTION = {
         0: (0, 1),  # right
         1: (0, -1),  # left
@@ -13,12 +18,18 @@ class Maze(gym.Env):
         3: (1, 0)  # down
     }
 
-    def __init__(self, n_row=5, n_col=5):
+    def __init__(self, n_row=5, n_col=5, render_mode=None, scenario_bank=None):
+        self.render_mode = render_mode
+        # stem of a maze bank written by src.utils.scenario_bank, resets copy a stored map if set
+        self.scenario_bank = None if scenario_bank is None else ScenarioBank(scenario_bank)
+        if self.scenario_bank is not None:
+            self.scenario_bank.check("maze", n_row, n_col)
         self.max_steps = None
-        self.grid = [[True for _ in range(n_col)] for _ in range(n_row)]
-
-        self.n_row = len(self.grid)
-        self.n_col = len(self.grid[0])
+        self.n_row = n_row
+        self.n_col = n_col
+        # obstacles and visited cells are bitboards, grid is the unpacked obstacle map used for observations
+        self.board = Bitboard(n_row, n_col)
+        self.set_grid(np.ones((n_row, n_col), dtype=np.int8))
 
         self.action_space = gym.spaces.Discrete(4)
         self.observation_space = spaces.Dict({
@@ -33,8 +44,11 @@ class Maze(gym.Env):
         self.n_steps = None
         self.loop_penalty = 0
 
-        self.visited = set()
+        self.visited = 0
         self.stock_prob = 0.5
+        # random maps are generated MAP_POOL_SIZE at a time and used up one per reset
+        self.map_pool = []
+        self.map_pool_prob = None
 
     def step(self, action):
         self.n_steps += 1
@@ -47,32 +61,48 @@ class Maze(gym.Env):
         new_row = max(min(self.current[0] + self.ACTION[action][0], self.n_row - 1), 0)
         new_col = max(min(self.current[1] + self.ACTION[action][1], self.n_col - 1), 0)
 
-        if self.grid[new_row][new_col] == 0:
+        if not self.board.test(self.obstacles, new_row, new_col):
             self.current = [new_row, new_col]
 
-        if tuple(self.current) in self.visited:
+        current = self.board.bit(*self.current)
+        if self.visited & current:
             reward = self.loop_penalty
 
         if self.current == self.goal:
             done = True
             reward = 1
 
-        self.visited.add(tuple(self.current))
+        self.visited |= current
 
         if self.max_steps is not None and self.n_steps >= self.max_steps:
             done = True
             truncate = True
 
+        if self.render_mode == "human":
+            self.render()
         return self.observe(), reward, done, truncate, info
 
     def reset(self, *, seed=None, options=None):
+        super().reset(seed=seed)
+        if seed is not None:
+            self.map_pool = []
         self.current = [0, 0]
-        self.visited = set()
-        self.visited.add(tuple(self.current))
+        self.visited = self.board.bit(*self.current)
         self.n_steps = 0
-        self.set_random_map(self.stock_prob)
+        if self.scenario_bank is None:
+            self.set_random_map(self.stock_prob)
+        elif options is not None and "scenario" in options:
+            self.set_grid(self.scenario_bank[options["scenario"]])
+        else:
+            self.set_grid(self.scenario_bank.sample(self.np_random, self.stock_prob))
+        if self.render_mode == "human":
+            self.render()
         return self.observe(), {}
 
+    def render(self):
+        if self.render_mode == "human":
+            self.print_grid()
+
     def print_grid(self):
         for row in range(self.n_row):
             for col in range(self.n_col):
@@ -88,15 +118,18 @@ class Maze(gym.Env):
 
     def observe(self):
         return {
-            'grid': np.array(self.grid),
+            'grid': self.grid.copy(),
             'current': np.array(self.current),
             'goal': np.array(self.goal)
         }
 
     def set_grid(self, grid):
-        self.grid = grid
+        self.obstacles = self.board.pack(grid)
+        self.grid = self.board.unpack(self.obstacles).view(np.int8)
 
     def set_random_map(self, stock_prob):
-        new_map = generate_random_map(self.n_row, self.n_col, stock_prob)
-
-        self.grid = new_map
+        if not self.map_pool or stock_prob != self.map_pool_prob:
+            maps = generate_random_maps(self.n_row, self.n_col, stock_prob, MAP_POOL_SIZE, rng=self.np_random)
+            self.map_pool = list(maps)
+            self.map_pool_prob = stock_prob
+        self.set_grid(self.map_pool.pop())
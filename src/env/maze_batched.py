@@ -0,0 +1,119 @@
+import gymnasium.spaces as spaces
+import numpy as np
+from gymnasium.vector import VectorEnv
+
+from src.env.maze import Maze
+from src.utils.grid import generate_random_maps
+
+
+class VectorMaze(VectorEnv):
+    """
+    B Maze envs kept in stacked arrays and stepped together with the same rules as Maze.
+    Finished mazes are reset automatically with maps from generate_random_maps; as in gymnasium's own vector envs,
+    their last observation is in infos["final_observation"] and infos["_final_observation"] marks them.
+    """
+    metadata = {"render_modes": [], "autoreset": True}
+
+    def __init__(self, num_envs: int = 64, n_row: int = 5, n_col: int = 5, stock_prob: float = 0.5,
+                 max_steps: int = None):
+        self.n_row = n_row
+        self.n_col = n_col
+        self.stock_prob = stock_prob
+        self.max_steps = max_steps
+        self.loop_penalty = 0
+        self.render_mode = None
+
+        self.single_observation_space = spaces.Dict({
+            "grid": spaces.MultiBinary([n_row, n_col]),
+            "current": spaces.MultiDiscrete([n_row, n_col]),
+            "goal": spaces.MultiDiscrete([n_row, n_col])
+        })
+        self.single_action_space = spaces.Discrete(4)
+        super().__init__(num_envs, self.single_observation_space, self.single_action_space)
+
+        self.moves = np.array([Maze.ACTION[action] for action in range(4)], dtype=np.int64)
+        self.upper = np.array([n_row - 1, n_col - 1], dtype=np.int64)
+        self.goal = np.broadcast_to(self.upper, (num_envs, 2))
+
+        self.grid = np.ones((num_envs, n_row, n_col), dtype=np.int8)
+        self.visited = np.zeros((num_envs, n_row, n_col), dtype=bool)
+        self.current = np.zeros((num_envs, 2), dtype=np.int64)
+        self.n_steps = np.zeros(num_envs, dtype=np.int64)
+        self.env_index = np.arange(num_envs)
+
+        self.rng = np.random.default_rng()
+        self.actions = None
+        # a few finished mazes per step would each pay the generator's fixed cost, so maps are drawn in bulk
+        self.map_pool = np.zeros((0, n_row, n_col), dtype=np.int8)
+
+    def observe(self, index=slice(None)) -> dict:
+        return {
+            "grid": self.grid[index].copy(),
+            "current": self.current[index].copy(),
+            "goal": self.goal[index].copy(),
+        }
+
+    def reset_envs(self, index: np.ndarray):
+        """
+        Start a new episode on a fresh random map in every maze of index
+        :param index: 1D array of env indices
+        """
+        if len(self.map_pool) < len(index):
+            count = max(len(index), 4 * self.num_envs)
+            maps = generate_random_maps(self.n_row, self.n_col, self.stock_prob, count, rng=self.rng)
+            self.map_pool = np.concatenate([self.map_pool, maps.astype(np.int8)])
+        self.grid[index] = self.map_pool[:len(index)]
+        self.map_pool = self.map_pool[len(index):]
+        self.current[index] = 0
+        self.visited[index] = False
+        self.visited[index, 0, 0] = True
+        self.n_steps[index] = 0
+
+    def reset_wait(self, seed=None, options=None):
+        if seed is not None:
+            self.rng = np.random.default_rng(seed)
+            self.map_pool = self.map_pool[:0]
+        self.reset_envs(self.env_index)
+        return self.observe(), {}
+
+    def step_async(self, actions):
+        self.actions = np.asarray(actions, dtype=np.int64).reshape(self.num_envs)
+
+    def step_wait(self):
+        moved = np.clip(self.current + self.moves[self.actions], 0, self.upper)
+        blocked = self.grid[self.env_index, moved[:, 0], moved[:, 1]] != 0
+        self.current = np.where(blocked[:, None], self.current, moved)
+        rows, cols = self.current[:, 0], self.current[:, 1]
+
+        rewards = np.where(self.visited[self.env_index, rows, cols], self.loop_penalty, 0).astype(np.float64)
+        terminated = (rows == self.n_row - 1) & (cols == self.n_col - 1)
+        rewards[terminated] = 1
+        self.visited[self.env_index, rows, cols] = True
+
+        self.n_steps += 1
+        truncated = np.zeros(self.num_envs, dtype=bool)
+        if self.max_steps is not None:
+            # Maze reports running out of steps as both done and truncated
+            truncated = self.n_steps >= self.max_steps
+            terminated |= truncated
+
+        infos = {}
+        dones = terminated | truncated
+        finished = self.env_index[dones]
+        if finished.size:
+            final_observation = np.full(self.num_envs, None, dtype=object)
+            final_info = np.full(self.num_envs, None, dtype=object)
+            terminal = self.observe(finished)
+            for i, env_idx in enumerate(finished):
+                final_observation[env_idx] = {key: value[i] for key, value in terminal.items()}
+                final_info[env_idx] = {}
+            infos["final_observation"] = final_observation
+            infos["_final_observation"] = dones
+            infos["final_info"] = final_info
+            infos["_final_info"] = dones
+            self.reset_envs(finished)
+
+        return self.observe(), rewards, terminated, truncated, infos
+
+    def close_extras(self, **kwargs):
+        pass
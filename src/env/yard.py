@@ -0,0 +1,99 @@
+"""
+Pure-functional core of the commander yard.
+
+A YardState is immutable: transition() never touches its input and returns a new state, so search code can branch
+without copying envs and cache results by state.key(). The step rules are the ones of the commander envs, run by the
+kernels of src.utils.kernels on the same rank grids the envs keep.
+"""
+from typing import NamedTuple
+
+import numpy as np
+
+from src.utils.kernels import commander_mask, commander_step, make_buffers
+
+NO_STOCK = 0
+SRC_POSITION_MARKER = -1
+
+
+class YardState(NamedTuple):
+    """
+    ranks holds the priority rank of every stock, 0 for empty cells and -1 for the place the loaded stock was taken
+    from. The array is read-only.
+    """
+    ranks: np.ndarray
+    loading: int = NO_STOCK
+    loaded_row: int = -1
+    loaded_col: int = -1
+    n_stocks: int = 0
+    n_steps: int = 0
+
+    def key(self) -> tuple:
+        """
+        Hashable identity of the yard, n_steps left out
+        """
+        return self.ranks.tobytes(), self.loading, self.loaded_row, self.loaded_col
+
+    @property
+    def done(self) -> bool:
+        return self.n_stocks <= 0
+
+
+def freeze(ranks: np.ndarray) -> np.ndarray:
+    ranks.flags.writeable = False
+    return ranks
+
+
+def make_state(ranks, loading: int = NO_STOCK, loaded_place: tuple = None, n_steps: int = 0) -> YardState:
+    """
+    :param ranks: 2D array, copied
+    :param loading: rank of the loaded stock, NO_STOCK if nothing is loaded
+    :param loaded_place: place the loaded stock was taken from
+    :return: YardState
+    """
+    ranks = np.array(ranks, dtype=np.int64)
+    loaded_row, loaded_col = (-1, -1) if loaded_place is None else loaded_place
+    n_stocks = int(np.count_nonzero(ranks > 0)) + (loading != NO_STOCK)
+    return YardState(freeze(ranks), int(loading), int(loaded_row), int(loaded_col), n_stocks, n_steps)
+
+
+def transition(state: YardState, row: int, col: int, loop_penalty: float = -0.1, complete_reward: float = 1) -> tuple:
+    """
+    Load or unload at (row, col)
+    :return: (next state, reward, done)
+    """
+    ranks = state.ranks.copy()
+    visited, queue = make_buffers(*ranks.shape)
+    reward, loading, loaded_row, loaded_col, n_completed = commander_step(
+        ranks, row, col, state.loading, state.loaded_row, state.loaded_col, NO_STOCK, False,
+        loop_penalty, complete_reward, visited, queue)
+    if loading == NO_STOCK:
+        loaded_row, loaded_col = -1, -1
+    n_stocks = state.n_stocks - n_completed
+    next_state = YardState(freeze(ranks), int(loading), int(loaded_row), int(loaded_col), n_stocks, state.n_steps + 1)
+    return next_state, float(reward), n_stocks <= 0
+
+
+def action_mask(state: YardState) -> np.ndarray:
+    """
+    Valid actions of state, flattened (row * n_col + col)
+    :return: 1D bool array
+    """
+    visited, queue = make_buffers(*state.ranks.shape)
+    mask = np.zeros(state.ranks.size, dtype=bool)
+    commander_mask(state.ranks, state.loading, state.loaded_row, state.loaded_col, NO_STOCK, False,
+                   mask, visited, queue)
+    return mask
+
+
+def transition_batch(states: list, actions, loop_penalty: float = -0.1, complete_reward: float = 1) -> tuple:
+    """
+    transition() for every (state, flat action) pair
+    :return: (list of next states, 1D rewards, 1D dones)
+    """
+    n_col = states[0].ranks.shape[1] if states else 1
+    results = [transition(state, int(action) // n_col, int(action) % n_col, loop_penalty, complete_reward)
+               for state, action in zip(states, actions)]
+    if not results:
+        return [], np.zeros(0, dtype=np.float32), np.zeros(0, dtype=bool)
+    next_states, rewards, dones = zip(*results)
+    return list(next_states), np.array(rewards, dtype=np.float32), np.array(dones, dtype=bool)
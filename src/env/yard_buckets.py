@@ -0,0 +1,95 @@
+from functools import partial
+
+import numpy as np
+from gymnasium.vector import SyncVectorEnv
+
+from src.env.env_transporter import StorageYard
+
+# rows and columns are each padded up to the next of these, for yards from 4x4 to 30x30
+BUCKET_SIZES = (6, 9, 13, 19, 30)
+
+
+def bucket_shape(n_row: int, n_col: int, bucket_sizes: tuple = BUCKET_SIZES) -> tuple:
+    """
+    :return: (rows, cols) of the smallest bucket an n_row x n_col yard fits in
+    """
+    return round_up(n_row, bucket_sizes), round_up(n_col, bucket_sizes)
+
+
+def round_up(length: int, bucket_sizes: tuple) -> int:
+    for size in sorted(bucket_sizes):
+        if length <= size:
+            return size
+    raise ValueError(f"{length} is larger than the largest bucket size of {bucket_sizes}")
+
+
+def padding_ratio(sizes, padded_shapes) -> float:
+    """
+    :return: fraction of the observed cells that are padding
+    """
+    cells = sum(n_row * n_col for n_row, n_col in sizes)
+    observed = sum(n_row * n_col for n_row, n_col in padded_shapes)
+    return 1 - cells / observed
+
+
+class BucketedStorageYards:
+    """
+    StorageYard envs of many sizes, grouped by size into buckets. Each bucket pads its yards only up to its own
+    shape and is a SyncVectorEnv, so a batch of a bucket stacks observations of one shape that are mostly yard instead
+    of padding to the largest yard. Buckets are reset and stepped one by one with their own batch of actions, and
+    a policy with size-independent weights (convolutions with global pooling) can train on all of them.
+
+        yards = BucketedStorageYards([(4, 4), (5, 7), (12, 12), (30, 30)])
+        obs, infos = yards.reset(seed=0)
+        for shape, bucket_obs in obs.items():
+            actions[shape] = policy(bucket_obs)
+        obs, rewards, terminated, truncated, infos = yards.step(actions)
+    """
+
+    def __init__(self, sizes, bucket_sizes: tuple = BUCKET_SIZES, **env_kwargs):
+        """
+        :param sizes: (n_row, n_col) of every env
+        :param env_kwargs: passed on to every StorageYard
+        """
+        if env_kwargs.get("zero_copy"):
+            # SyncVectorEnv autoresets a finished env before returning its final observation
+            raise ValueError("Bucketed yards need observation copies, zero_copy is not supported")
+        self.sizes = [tuple(size) for size in sizes]
+        groups = {}
+        for index, (n_row, n_col) in enumerate(self.sizes):
+            groups.setdefault(bucket_shape(n_row, n_col, bucket_sizes), []).append(index)
+        # bucket shape -> indices of its envs in sizes
+        self.env_index = {shape: np.array(index) for shape, index in sorted(groups.items())}
+        self.buckets = {
+            shape: SyncVectorEnv([partial(StorageYard, *self.sizes[i], max_size=shape, **env_kwargs) for i in index])
+            for shape, index in self.env_index.items()
+        }
+
+    @property
+    def num_envs(self) -> int:
+        return len(self.sizes)
+
+    @property
+    def padding_ratio(self) -> float:
+        return padding_ratio(self.sizes, [shape for shape, index in self.env_index.items() for _ in index])
+
+    def reset(self, seed: int = None):
+        """
+        :return: dicts of bucket shape -> batched observations and infos
+        """
+        obs, infos = {}, {}
+        for offset, (shape, bucket) in enumerate(self.buckets.items()):
+            obs[shape], infos[shape] = bucket.reset(seed=None if seed is None else seed + offset * self.num_envs)
+        return obs, infos
+
+    def step(self, actions: dict):
+        """
+        :param actions: dict of bucket shape -> actions of its envs
+        :return: obs, rewards, terminated, truncated and infos, each a dict of bucket shape -> batch
+        """
+        results = {shape: bucket.step(actions[shape]) for shape, bucket in self.buckets.items()}
+        return tuple({shape: result[i] for shape, result in results.items()} for i in range(5))
+
+    def close(self):
+        for bucket in self.buckets.values():
+            bucket.close()
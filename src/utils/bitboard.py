@@ -0,0 +1,58 @@
+import numpy as np
+
+
+class Bitboard:
+    """
+    Layout of an n_row x n_col grid packed into a Python int, cell (row, col) is bit row * n_col + col.
+    Boards are plain ints, so moves and collision checks are single bit tests and grow() expands a whole
+    frontier with a few shifts and masks, as the distance fields of src.utils.shaping do.
+    """
+
+    def __init__(self, n_row: int, n_col: int):
+        self.n_row = n_row
+        self.n_col = n_col
+        self.n_cells = n_row * n_col
+        self.n_bytes = (self.n_cells + 7) // 8
+        self.full = (1 << self.n_cells) - 1
+        first_col = sum(1 << (row * n_col) for row in range(n_row))
+        # shifting by one column wraps around the row ends, these masks drop the wrapped bits
+        self.not_first_col = self.full & ~first_col
+        self.not_last_col = self.full & ~(first_col << (n_col - 1))
+
+    def bit(self, row: int, col: int) -> int:
+        return 1 << (row * self.n_col + col)
+
+    def test(self, board: int, row: int, col: int) -> bool:
+        return bool((board >> (row * self.n_col + col)) & 1)
+
+    def pack(self, grid) -> int:
+        """
+        :param grid: 2D array or list, non-zero cells become set bits
+        :return: int
+        """
+        bits = np.packbits(np.asarray(grid, dtype=bool).reshape(-1), bitorder="little")
+        return int.from_bytes(bits.tobytes(), "little")
+
+    def pack_cells(self, rows, cols) -> int:
+        board = 0
+        for row, col in zip(rows, cols):
+            board |= 1 << (int(row) * self.n_col + int(col))
+        return board
+
+    def unpack(self, board: int) -> np.ndarray:
+        """
+        :param board: int
+        :return: 2D uint8 array, 1 for set bits
+        """
+        data = np.frombuffer(board.to_bytes(self.n_bytes, "little"), dtype=np.uint8)
+        return np.unpackbits(data, count=self.n_cells, bitorder="little").reshape(self.n_row, self.n_col)
+
+    def count(self, board: int) -> int:
+        return bin(board).count("1")
+
+    def grow(self, board: int) -> int:
+        """
+        board plus its 4-neighbours
+        """
+        return (board | (board << self.n_col) | (board >> self.n_col)
+                | ((board << 1) & self.not_first_col) | ((board >> 1) & self.not_last_col)) & self.full
@@ -0,0 +1,26 @@
+from stable_baselines3.common.callbacks import BaseCallback
+
+from src.utils.profiling import merge_stats
+
+
+class EnvProfileCallback(BaseCallback):
+    """
+    Logs the phase timings of ProfiledEnv envs next to the SB3 metrics, so they show up in TensorBoard.
+    Every log_every calls the stats of all envs are merged, recorded under env_profile/ and cleared.
+
+        vec_env = make_vec_env(lambda: ProfiledEnv(Maze()), args.num_envs, args.backend)
+        model.learn(total_timesteps, callback=EnvProfileCallback())
+    """
+
+    def __init__(self, log_every: int = 1_000, verbose: int = 0):
+        super().__init__(verbose)
+        self.log_every = log_every
+
+    def _on_step(self) -> bool:
+        if self.n_calls % self.log_every == 0:
+            stats = merge_stats(self.training_env.env_method("stats"))
+            self.training_env.env_method("clear_stats")
+            for phase, phase_stats in stats.items():
+                self.logger.record(f"env_profile/{phase}_mean_us", phase_stats["mean_us"])
+                self.logger.record(f"env_profile/{phase}_total_s", phase_stats["total_s"])
+        return True
@@ -0,0 +1,82 @@
+"""
+Stock-count curriculum shared by env copies running in different processes.
+
+Without it every env raises its own stock count after upgrade_interval of its own clears, so K workers each move
+K times slower and drift apart. A SharedCurriculum counts the clears of all envs in shared memory and every env
+reads the same stock count at reset:
+
+    curriculum = SharedCurriculum(first_n_stocks=5, final_n_stocks=18, upgrade_interval=2_000)
+    vec_env = make_vec_env(lambda: GridCommander(curriculum=curriculum), args.num_envs, args.backend)
+
+Every env gets its own slot in a shared int64 array and is the only writer of that slot, so counting a clear takes
+no lock. The count is the sum of the slots, read at reset. Hand the curriculum to the workers through the env
+functions, as with the buffers of SharedMemoryVecEnv.
+"""
+import ctypes
+import multiprocessing as mp
+from multiprocessing.reduction import ForkingPickler
+
+import numpy as np
+
+MAX_SLOTS = 256
+
+
+class SharedCurriculum:
+    def __init__(self, first_n_stocks: int = 5, final_n_stocks: int = 18, upgrade_interval: int = 2_000,
+                 max_slots: int = MAX_SLOTS, start_method: str = None):
+        """
+        :param upgrade_interval: clears of all envs together per additional stock
+        :param max_slots: number of envs that can attach, probe envs built to read the spaces included
+        :param start_method: multiprocessing start method of the workers, the default of SharedMemoryVecEnv and
+        SubprocVecEnv if None
+        """
+        if start_method is None:
+            start_method = "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+        ctx = mp.get_context(start_method)
+        self.first_n_stocks = first_n_stocks
+        self.final_n_stocks = final_n_stocks
+        self.upgrade_interval = upgrade_interval
+        self.slots = ctx.RawArray(ctypes.c_int64, max_slots)
+        self.n_attached = ctx.Value(ctypes.c_int64, 0)
+        self.view = None
+
+    def __getstate__(self):
+        # the env functions go to the workers through cloudpickle, which does not know how multiprocessing
+        # pickles shared ctypes, so they are pickled by multiprocessing itself while the worker is spawned
+        state = self.__dict__.copy()
+        state["view"] = None
+        return {"shared": bytes(ForkingPickler.dumps(state))}
+
+    def __setstate__(self, state):
+        self.__dict__.update(ForkingPickler.loads(state["shared"]))
+
+    @property
+    def clears(self) -> np.ndarray:
+        if self.view is None:
+            self.view = np.frombuffer(self.slots, dtype=np.int64)
+        return self.view
+
+    def attach(self) -> int:
+        """
+        :return: slot of a new env
+        """
+        with self.n_attached.get_lock():
+            slot = self.n_attached.value
+            if slot >= len(self.slots):
+                raise RuntimeError(f"More than {len(self.slots)} envs attached to the curriculum, raise max_slots")
+            self.n_attached.value += 1
+        return slot
+
+    def record_clear(self, slot: int, count: int = 1):
+        self.clears[slot] += count
+
+    @property
+    def n_clear(self) -> int:
+        return int(self.clears.sum())
+
+    @property
+    def n_stocks(self) -> int:
+        """
+        Stock count for the next reset
+        """
+        return min(self.first_n_stocks + self.n_clear // self.upgrade_interval, self.final_n_stocks)
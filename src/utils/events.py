@@ -0,0 +1,40 @@
+import heapq
+import itertools
+import math
+
+ARRIVAL = 0
+DEPARTURE = 1
+
+
+class EventQueue:
+    """
+    Discrete-event queue, events are (time, kind, stock) and come out in time order.
+    Events with the same time come out in the order they were pushed.
+    """
+
+    def __init__(self):
+        self.heap = []
+        self.counter = itertools.count()
+
+    def __len__(self):
+        return len(self.heap)
+
+    def clear(self):
+        self.heap.clear()
+        self.counter = itertools.count()
+
+    def push(self, time: float, kind: int, stock: int):
+        heapq.heappush(self.heap, (time, next(self.counter), kind, stock))
+
+    def next_time(self) -> float:
+        """
+        :return: time of the next event, inf if there is none
+        """
+        return self.heap[0][0] if self.heap else math.inf
+
+    def pop(self) -> tuple:
+        """
+        :return: (time, kind, stock) of the next event
+        """
+        time, _, kind, stock = heapq.heappop(self.heap)
+        return time, kind, stock
@@ -2,6 +2,8 @@ from collections import deque
 
 import numpy as np
 
+MIN_MAP_BATCH = 16
+
 
 def is_reachable(grid, src, dst):
     """
@@ -29,21 +31,241 @@ def is_reachable(grid, src, dst):
     return False
 
 
-def generate_random_map(n_row, n_col, stock_prob):
+def generate_random_map(n_row, n_col, stock_prob, rng=None):
     """
     Generate random map
     :param n_row: int
     :param n_col: int
     :param stock_prob: float
+    :param rng: np.random.Generator, the global numpy random state if None
     :return: 2D array
     """
-    while True:
-        grid = np.zeros((n_row, n_col))
-        for r in range(n_row):
-            for c in range(n_col):
-                if np.random.rand() < stock_prob:
-                    grid[r, c] = 1
-        grid[0, 0] = 0
-        grid[n_row - 1, n_col - 1] = 0
-        if is_reachable(grid, (0, 0), (n_row - 1, n_col - 1)):
-            return grid
+    return generate_random_maps(n_row, n_col, stock_prob, 1, rng=rng)[0]
+
+
+def generate_random_maps(n_row, n_col, stock_prob, count, rng=None):
+    """
+    Generate count random maps at once, each with a path from (0, 0) to (n_row - 1, n_col - 1)
+    :param n_row: int
+    :param n_col: int
+    :param stock_prob: float
+    :param count: int
+    :param rng: np.random.Generator, the global numpy random state if None
+    :return: (count, n_row, n_col) array
+    """
+    random = np.random.random if rng is None else rng.random
+    maps = []
+    n_drawn = n_found = 0
+    while n_found < count:
+        # dense maps are mostly rejected, draw enough for the acceptance rate seen so far
+        acceptance = max(n_found / n_drawn, 0.01) if n_drawn else 1
+        n_draw = max(int((count - n_found) / acceptance * 1.2), MIN_MAP_BATCH)
+        grids = (random((n_draw, n_row, n_col)) < stock_prob).astype(float)
+        grids[:, 0, 0] = 0
+        grids[:, n_row - 1, n_col - 1] = 0
+        valid = grids[corner_reachable(grids == 0)]
+        maps.append(valid)
+        n_drawn += n_draw
+        n_found += len(valid)
+    return np.concatenate(maps)[:count]
+
+
+def corner_reachable(passable):
+    """
+    Check for every map if (n_row - 1, n_col - 1) can be reached from (0, 0).
+    All maps grow together with one 4-neighbour dilation per iteration, and maps that reached the corner
+    or stopped growing are dropped from the batch.
+    :param passable: (n_maps, n_row, n_col) bool array
+    :return: 1D bool array
+    """
+    result = np.zeros(len(passable), dtype=bool)
+    active = np.arange(len(passable))
+    reached = np.zeros_like(passable)
+    reached[:, 0, 0] = passable[:, 0, 0]
+    while active.size:
+        grown = reached.copy()
+        grown[:, 1:, :] |= reached[:, :-1, :]
+        grown[:, :-1, :] |= reached[:, 1:, :]
+        grown[:, :, 1:] |= reached[:, :, :-1]
+        grown[:, :, :-1] |= reached[:, :, 1:]
+        grown &= passable
+        arrived = grown[:, -1, -1]
+        result[active[arrived]] = True
+        keep = ~arrived & (grown != reached).any(axis=(1, 2))
+        active, reached, passable = active[keep], grown[keep], passable[keep]
+    return result
+
+
+def sample_cells(rng, mask, n_cells, size=None):
+    """
+    Pick n_cells distinct cells among the True cells of mask, all at once
+    :param rng: np.random.Generator
+    :param mask: 2D bool array of the cells that can be picked
+    :param n_cells: int
+    :param size: number of independent picks, None for a single one
+    :return: (rows, cols), 1D arrays of length n_cells, or (size, n_cells) arrays if size is given
+    """
+    allowed = np.flatnonzero(mask)
+    if n_cells > len(allowed):
+        raise ValueError("Too many stocks to place")
+    if size is None:
+        picked = allowed[rng.choice(len(allowed), size=n_cells, replace=False)]
+    else:
+        # one random permutation per pick
+        picked = allowed[np.argsort(rng.random((size, len(allowed))), axis=1)[:, :n_cells]]
+    return np.unravel_index(picked, np.shape(mask))
+
+
+class ReachabilityIndex:
+    """
+    Connected components of the passable cells of a grid, kept up to date one cell at a time.
+    A cell is passable if it is empty or holds -1, the same rule as is_reachable.
+    Opening a cell merges the components around it, closing a cell splits its component if needed,
+    and is_reachable compares two labels.
+    """
+    NEIGHBOURS = ((0, 1), (0, -1), (1, 0), (-1, 0))
+
+    def __init__(self, n_row: int, n_col: int):
+        self.n_row = n_row
+        self.n_col = n_col
+        self.labels = [[-1 for _ in range(n_col)] for _ in range(n_row)]
+        self.members = {}
+        self.next_label = 0
+        self.dirty = True
+
+    def invalidate(self):
+        """
+        Mark the index as stale, it is rebuilt from the grid on the next query
+        """
+        self.dirty = True
+
+    def neighbours(self, row: int, col: int):
+        for dr, dc in self.NEIGHBOURS:
+            nr, nc = row + dr, col + dc
+            if 0 <= nr < self.n_row and 0 <= nc < self.n_col:
+                yield nr, nc
+
+    def new_label(self, cells: set) -> int:
+        label = self.next_label
+        self.next_label += 1
+        self.members[label] = cells
+        for r, c in cells:
+            self.labels[r][c] = label
+        return label
+
+    def rebuild(self, grid):
+        """
+        Label every passable cell of grid with a full flood fill
+        :param grid: 2D array or list
+        """
+        if isinstance(grid, np.ndarray):
+            grid = grid.tolist()
+        self.labels = [[-1 for _ in range(self.n_col)] for _ in range(self.n_row)]
+        self.members = {}
+        self.next_label = 0
+        for row in range(self.n_row):
+            for col in range(self.n_col):
+                value = grid[row][col]
+                if self.labels[row][col] != -1 or (value and value != -1):
+                    continue
+                cells = {(row, col)}
+                q = deque([(row, col)])
+                while q:
+                    r, c = q.popleft()
+                    for nr, nc in self.neighbours(r, c):
+                        value = grid[nr][nc]
+                        if (nr, nc) not in cells and (not value or value == -1):
+                            cells.add((nr, nc))
+                            q.append((nr, nc))
+                self.new_label(cells)
+        self.dirty = False
+
+    def open(self, row: int, col: int):
+        """
+        Make (row, col) passable and merge the components around it
+        """
+        if self.dirty or self.labels[row][col] != -1:
+            return
+        around = {self.labels[r][c] for r, c in self.neighbours(row, col)} - {-1}
+        if not around:
+            self.new_label({(row, col)})
+            return
+        label = max(around, key=lambda l: len(self.members[l]))
+        cells = self.members[label]
+        for other in around - {label}:
+            for r, c in self.members.pop(other):
+                self.labels[r][c] = label
+                cells.add((r, c))
+        cells.add((row, col))
+        self.labels[row][col] = label
+
+    def close(self, row: int, col: int):
+        """
+        Make (row, col) blocked and split its component if it was a bridge
+        """
+        if self.dirty or self.labels[row][col] == -1:
+            return
+        label = self.labels[row][col]
+        self.labels[row][col] = -1
+        cells = self.members[label]
+        cells.discard((row, col))
+        if not cells:
+            del self.members[label]
+            return
+
+        remaining = [n for n in self.neighbours(row, col) if self.labels[n[0]][n[1]] == label]
+        while len(remaining) > 1:
+            start, targets = remaining[0], set(remaining[1:])
+            visited = {start}
+            q = deque([start])
+            while q and targets:
+                r, c = q.popleft()
+                for n in self.neighbours(r, c):
+                    if n not in visited and self.labels[n[0]][n[1]] == label:
+                        visited.add(n)
+                        targets.discard(n)
+                        q.append(n)
+            if not targets:
+                return
+            # start's side is cut off from the rest; give it a label of its own
+            cells -= visited
+            self.new_label(visited)
+            remaining = [n for n in remaining if n not in visited]
+
+    def reachable_cells(self, grid, src: tuple) -> set:
+        """
+        Every passable cell that can be reached from src, src itself excluded
+        :param grid: 2D array or list, only read when the index is stale
+        :param src: tuple
+        :return: set of tuples
+        """
+        if self.dirty:
+            self.rebuild(grid)
+        src_label = self.labels[src[0]][src[1]]
+        if src_label != -1:
+            return self.members[src_label] - {src}
+        cells = set()
+        for label in {self.labels[r][c] for r, c in self.neighbours(*src)} - {-1}:
+            cells |= self.members[label]
+        return cells
+
+    def is_reachable(self, grid, src: tuple, dst: tuple) -> bool:
+        """
+        Check if it is possible to move from src to dst, same result as is_reachable(grid, src, dst)
+        :param grid: 2D array or list, only read when the index is stale
+        :param src: tuple
+        :param dst: tuple
+        :return: bool
+        """
+        if self.dirty:
+            self.rebuild(grid)
+        if src == dst:
+            return True
+        dst_label = self.labels[dst[0]][dst[1]]
+        if dst_label == -1:
+            return False
+        src_label = self.labels[src[0]][src[1]]
+        if src_label != -1:
+            return src_label == dst_label
+        # src itself may be blocked (e.g. a loaded stock marker), it still reaches its neighbours
+        return any(self.labels[r][c] == dst_label for r, c in self.neighbours(*src))
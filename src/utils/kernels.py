@@ -0,0 +1,165 @@
+"""
+Compiled step kernels for the commander envs.
+
+The functions are written in the subset of Python that numba compiles. They are jitted when numba is importable
+and stay plain Python otherwise, so both versions can be run against each other and against the envs' own
+step logic. Grids are 2D integer NumPy arrays with 0 for empty cells and stocks holding their priority rank.
+"""
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+KERNEL_BACKENDS = ("auto", "python", "numba")
+
+
+def resolve_backend(backend: str) -> str:
+    """
+    :param backend: one of KERNEL_BACKENDS, "auto" picks numba when it is installed
+    :return: "python" or "numba"
+    """
+    if backend not in KERNEL_BACKENDS:
+        raise ValueError(f"Unknown backend {backend}, expected one of {KERNEL_BACKENDS}")
+    if backend == "auto":
+        return "python" if numba is None else "numba"
+    if backend == "numba" and numba is None:
+        raise ImportError("The numba backend needs numba to be installed")
+    return backend
+
+
+def jit(fn):
+    if numba is None:
+        return fn
+    return numba.njit(cache=True)(fn)
+
+
+@jit
+def is_passable(value) -> bool:
+    return value == 0 or value == -1
+
+
+@jit
+def is_loadable(value, negate_loaded: bool) -> bool:
+    if negate_loaded:
+        return value > 0
+    return value != 0 and value != -1
+
+
+@jit
+def flood_fill(grid, src_row, src_col, visited, queue) -> int:
+    """
+    Breadth-first search from (src_row, src_col) over the passable cells, src itself is always visited
+    :param visited: 2D bool buffer, overwritten
+    :param queue: 1D int64 buffer of n_row * n_col flat cell indices, the visited cells are left in queue[:count]
+    :return: count
+    """
+    n_row, n_col = grid.shape
+    visited[:, :] = False
+    visited[src_row, src_col] = True
+    queue[0] = src_row * n_col + src_col
+    head = 0
+    tail = 1
+    while head < tail:
+        row = queue[head] // n_col
+        col = queue[head] % n_col
+        head += 1
+        for dr, dc in ((0, 1), (0, -1), (1, 0), (-1, 0)):
+            nr = row + dr
+            nc = col + dc
+            if 0 <= nr < n_row and 0 <= nc < n_col and not visited[nr, nc] and is_passable(grid[nr, nc]):
+                visited[nr, nc] = True
+                queue[tail] = nr * n_col + nc
+                tail += 1
+    return tail
+
+
+@jit
+def complete_stocks(grid) -> int:
+    """
+    Remove the leading stocks that are already in the last column, in priority order, and renumber the others
+    :return: number of removed stocks
+    """
+    n_row, n_col = grid.shape
+    n_completed = 0
+    while True:
+        found = False
+        for row in range(n_row):
+            value = grid[row, n_col - 1]
+            if value == n_completed + 1:
+                found = True
+                break
+        if not found:
+            break
+        n_completed += 1
+    if n_completed == 0:
+        return 0
+    for row in range(n_row):
+        for col in range(n_col):
+            rank = grid[row, col]
+            if rank > 0:
+                if rank <= n_completed:
+                    grid[row, col] = 0
+                else:
+                    grid[row, col] = rank - n_completed
+    return n_completed
+
+
+@jit
+def commander_step(grid, row, col, loading_priority, loaded_row, loaded_col, no_stock, negate_loaded,
+                   loop_penalty, complete_reward, visited, queue):
+    """
+    One load or unload action, the same transition as the python step of the commander envs
+    :param grid: 2D array, updated in place
+    :param loading_priority: rank of the loaded stock, no_stock if nothing is loaded
+    :param loaded_row: row the loaded stock was taken from, ignored if nothing is loaded
+    :param negate_loaded: True if the loaded place holds -rank (GridOnlyCommander), False if it holds -1
+    :return: (reward, loading_priority, loaded_row, loaded_col, n_completed)
+    """
+    if loading_priority == no_stock:
+        value = grid[row, col]
+        if not is_loadable(value, negate_loaded):
+            return loop_penalty, loading_priority, loaded_row, loaded_col, 0
+        grid[row, col] = -value if negate_loaded else -1
+        return 0.0, value, row, col, 0
+
+    if row == loaded_row and col == loaded_col:
+        grid[row, col] = loading_priority
+        return loop_penalty, no_stock, loaded_row, loaded_col, 0
+
+    flood_fill(grid, loaded_row, loaded_col, visited, queue)
+    if not visited[row, col]:
+        return loop_penalty, loading_priority, loaded_row, loaded_col, 0
+    grid[row, col] = loading_priority
+    grid[loaded_row, loaded_col] = 0
+    n_completed = complete_stocks(grid)
+    return n_completed * complete_reward, no_stock, loaded_row, loaded_col, n_completed
+
+
+@jit
+def commander_mask(grid, loading_priority, loaded_row, loaded_col, no_stock, negate_loaded, mask, visited, queue):
+    """
+    Valid actions, the same rules as the action_masks of the commander envs
+    :param mask: 1D bool array of n_row * n_col, overwritten
+    """
+    n_row, n_col = grid.shape
+    mask[:] = False
+    if loading_priority == no_stock:
+        for row in range(n_row):
+            for col in range(n_col):
+                mask[row * n_col + col] = is_loadable(grid[row, col], negate_loaded)
+        return
+    count = flood_fill(grid, loaded_row, loaded_col, visited, queue)
+    for i in range(1, count):
+        mask[queue[i]] = True
+    if count == 1:
+        mask[loaded_row * n_col + loaded_col] = True
+
+
+def make_buffers(n_row: int, n_col: int) -> tuple:
+    """
+    Scratch buffers of the flood fill
+    :return: (visited, queue)
+    """
+    return np.zeros((n_row, n_col), dtype=np.bool_), np.zeros(n_row * n_col, dtype=np.int64)
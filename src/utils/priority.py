@@ -0,0 +1,89 @@
+import numpy as np
+
+
+class PriorityIndex:
+    """
+    Positions of the stocks in priority order, positions[p - 1] is the stock with priority p.
+    Inserting or completing stocks renumbers the priorities behind them, so the envs refresh only
+    those stocks' cells instead of rescanning the whole grid.
+    """
+
+    def __init__(self, positions: list = None):
+        self.positions = [] if positions is None else positions
+
+    @classmethod
+    def from_ranks(cls, ranks: np.ndarray):
+        """
+        Build the index from a grid of priorities
+        :param ranks: 2D array, priority of the stock in each cell and 0 (or less) for empty cells
+        :return: PriorityIndex
+        """
+        rows, cols = np.nonzero(ranks > 0)
+        order = np.argsort(ranks[rows, cols], kind="stable")
+        return cls([(int(rows[i]), int(cols[i])) for i in order])
+
+    def __len__(self):
+        return len(self.positions)
+
+    def clear(self):
+        self.positions.clear()
+
+    def position(self, priority: int) -> tuple:
+        return self.positions[priority - 1]
+
+    def insert(self, priority: int, position: tuple) -> int:
+        """
+        Insert a stock, every stock with the same or a lower priority moves one priority down
+        :param priority: int, clamped to 1..len(self) + 1
+        :param position: tuple
+        :return: the clamped priority
+        """
+        priority = min(max(priority, 1), len(self.positions) + 1)
+        self.positions.insert(priority - 1, position)
+        return priority
+
+    def prepend(self, positions):
+        """
+        Insert stocks ahead of all the others, the i-th position gets priority i + 1
+        :param positions: iterable of tuples
+        """
+        self.positions[:0] = positions
+
+    def move(self, priority: int, position: tuple):
+        self.positions[priority - 1] = position
+
+    def pop_completed(self, exit_col: int) -> list:
+        """
+        Remove the leading stocks that are already in the exit column, in priority order
+        :param exit_col: int
+        :return: list of the removed positions
+        """
+        count = 0
+        while count < len(self.positions) and self.positions[count][1] == exit_col:
+            count += 1
+        completed = self.positions[:count]
+        del self.positions[:count]
+        return completed
+
+    def pop(self, count: int) -> list:
+        """
+        Remove the count stocks of highest priority, e.g. the ones a compiled kernel has completed
+        :param count: int
+        :return: list of the removed positions
+        """
+        removed = self.positions[:count]
+        del self.positions[:count]
+        return removed
+
+    def cells(self, start: int = 1) -> tuple:
+        """
+        Rows, cols and priorities of the stocks from priority start on, ready for fancy indexing
+        :param start: int
+        :return: (rows, cols, priorities)
+        """
+        positions = self.positions[start - 1:]
+        if not positions:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, empty
+        rows, cols = zip(*positions)
+        return rows, cols, np.arange(start, start + len(positions))
@@ -0,0 +1,151 @@
+"""
+Opt-in timing counters for the internal phases of the envs.
+
+instrument() replaces the phase methods of one env instance with counting wrappers, the env classes themselves are
+not touched, so envs that are not instrumented pay nothing. Every call is counted but only one call in sample_every
+is timed, and the total time of a phase is estimated from the timed calls. Phases nest, e.g. "step" includes
+"observation", so their times are inclusive and do not add up to the step time.
+
+    env = ProfiledEnv(GridCommander(), sample_every=16)
+    ...
+    env.stats()["reachability"]["mean_us"]
+"""
+from time import perf_counter_ns
+
+import gymnasium as gym
+
+# phase -> attribute paths of the methods timed under it, paths missing on an env are skipped
+PHASES = {
+    "step": ("step",),
+    "reset": ("reset",),
+    "load": ("load_stock",),
+    "unload": ("unload_stock",),
+    "move": ("move",),
+    "toggle_load": ("toggle_load",),
+    "kernel": ("kernel_transition",),
+    "reachability": ("reachability.is_reachable", "reachability.reachable_cells"),
+    "completion": ("check_complete",),
+    "action_mask": ("action_masks",),
+    "observation": ("observe",),
+    "shaping": ("shaping.shape",),
+    "generation": ("place_random_stocks", "load_scenario", "set_random_map"),
+}
+
+
+def resolve(obj, path: str):
+    """
+    :return: (owner, name) of a dotted attribute path, owner is None if a part of the path is missing
+    """
+    *owners, name = path.split(".")
+    for owner in owners:
+        obj = getattr(obj, owner, None)
+    if obj is None or not callable(getattr(obj, name, None)):
+        return None, name
+    return obj, name
+
+
+class PhaseProfiler:
+    """
+    Call counts and sampled times per phase.
+    counters[phase] is a list [calls, timed calls, timed nanoseconds], shared by the wrappers of that phase.
+    """
+
+    def __init__(self, sample_every: int = 16):
+        if sample_every < 1:
+            raise ValueError("sample_every must be at least 1")
+        self.sample_every = sample_every
+        self.counters = {}
+
+    def wrap(self, phase: str, fn):
+        counter = self.counters.setdefault(phase, [0, 0, 0])
+        sample_every = self.sample_every
+
+        def timed(*args, **kwargs):
+            # the first call is always timed, so rare phases like resets get a time early on
+            if counter[0] % sample_every:
+                counter[0] += 1
+                return fn(*args, **kwargs)
+            counter[0] += 1
+            start = perf_counter_ns()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                counter[2] += perf_counter_ns() - start
+                counter[1] += 1
+
+        timed.__wrapped__ = fn
+        return timed
+
+    def clear(self):
+        for counter in self.counters.values():
+            counter[:] = 0, 0, 0
+
+    def stats(self) -> dict:
+        """
+        :return: dict of phase -> {"calls", "timed_calls", "timed_ns", "mean_us", "total_s"},
+        total_s is the mean time of the timed calls times the number of calls
+        """
+        return summarize({phase: tuple(counter) for phase, counter in self.counters.items()})
+
+
+def summarize(counters: dict) -> dict:
+    stats = {}
+    for phase, (calls, timed_calls, timed_ns) in counters.items():
+        mean_ns = timed_ns / timed_calls if timed_calls else 0.0
+        stats[phase] = {
+            "calls": calls,
+            "timed_calls": timed_calls,
+            "timed_ns": timed_ns,
+            "mean_us": mean_ns / 1e3,
+            "total_s": mean_ns * calls / 1e9,
+        }
+    return stats
+
+
+def merge_stats(all_stats) -> dict:
+    """
+    Combine the stats() of several envs, e.g. the workers of a VecEnv
+    :param all_stats: iterable of stats dicts
+    :return: stats dict
+    """
+    counters = {}
+    for stats in all_stats:
+        for phase, phase_stats in stats.items():
+            calls, timed_calls, timed_ns = counters.get(phase, (0, 0, 0))
+            counters[phase] = (calls + phase_stats["calls"], timed_calls + phase_stats["timed_calls"],
+                               timed_ns + phase_stats["timed_ns"])
+    return summarize(counters)
+
+
+def instrument(env: gym.Env, sample_every: int = 16) -> PhaseProfiler:
+    """
+    Time the phases of PHASES that env has. Objects the env replaces later, like the ReachabilityIndex rebuilt by
+    set_grid, are not timed anymore, so instrument after setting the grid up.
+    :param env: env or wrapper, its unwrapped env is instrumented
+    :param sample_every: time one call in sample_every, 1 times every call
+    :return: PhaseProfiler
+    """
+    env = env.unwrapped
+    profiler = PhaseProfiler(sample_every)
+    for phase, paths in PHASES.items():
+        for path in paths:
+            owner, name = resolve(env, path)
+            if owner is not None:
+                setattr(owner, name, profiler.wrap(phase, getattr(owner, name)))
+    return profiler
+
+
+class ProfiledEnv(gym.Wrapper):
+    """
+    Wrapper exposing the phase timings of the wrapped env through stats()
+    """
+
+    def __init__(self, env: gym.Env, sample_every: int = 16):
+        super().__init__(env)
+        self.profiler = instrument(env, sample_every)
+
+    def stats(self) -> dict:
+        return self.profiler.stats()
+
+    def clear_stats(self):
+        self.profiler.clear()
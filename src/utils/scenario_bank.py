@@ -0,0 +1,144 @@
+"""
+Precomputed initial yards, generated once and memory-mapped by the envs so that a reset only copies one grid.
+
+A bank is two files sharing a stem:
+    <stem>.npy   uint8 array (n_scenarios, n_row, n_col), one initial grid per scenario, uint16 for yards with
+                 more than 255 cells so that commander ranks fit
+    <stem>.json  kind, grid size, dtype and the [start, stop) range of the scenarios of every group
+
+The scenarios are sorted by group. Commander and transporter banks are grouped by stock count, maze banks by
+stock probability. What the cells hold depends on the kind:
+    commander    priority rank of the stock, 0 for empty cells
+    transporter  SimpleTransporter cell codes, 0 empty, 1 stock, 2 target
+    maze         1 for obstacles, 0 for empty cells
+
+    python -m src.utils.scenario_bank commander banks/commander_5x5 --size 5 5 --groups 5 18 --per-group 100000
+    python -m src.utils.scenario_bank maze banks/maze_5x5 --size 5 5 --probs 0.3 0.5 --per-group 100000
+"""
+import argparse
+import json
+
+import numpy as np
+
+from src.utils.grid import generate_random_maps, sample_cells
+
+KINDS = ("commander", "transporter", "maze")
+# scenarios generated at once, bounds the (count, n_cells) temporaries of the samplers
+GENERATION_SLICE = 4_096
+
+
+def bank_dtype(n_row: int, n_col: int) -> np.dtype:
+    """
+    :return: smallest unsigned dtype that holds every priority rank of an n_row x n_col yard
+    """
+    return np.dtype(np.uint8 if n_row * n_col <= np.iinfo(np.uint8).max else np.uint16)
+
+
+class ScenarioBank:
+    """
+    Read-only view of a bank written by write_bank, the grids stay on disk until they are sampled
+    """
+
+    def __init__(self, stem: str):
+        with open(f"{stem}.json") as f:
+            meta = json.load(f)
+        self.kind = meta["kind"]
+        self.n_row = meta["n_row"]
+        self.n_col = meta["n_col"]
+        self.groups = {key: tuple(bounds) for key, bounds in meta["groups"].items()}
+        self.grids = np.load(f"{stem}.npy", mmap_mode="r")
+        # banks written before the dtype was recorded are uint8
+        dtype = meta.get("dtype", "uint8")
+        if self.grids.dtype != np.dtype(dtype):
+            raise ValueError(f"{stem}.npy holds {self.grids.dtype} grids, {stem}.json says {dtype}")
+
+    def __len__(self):
+        return len(self.grids)
+
+    def __getitem__(self, index: int) -> np.ndarray:
+        return np.array(self.grids[index])
+
+    def check(self, kind: str, n_row: int, n_col: int):
+        if (self.kind, self.n_row, self.n_col) != (kind, n_row, n_col):
+            raise ValueError(f"Scenario bank holds {self.kind} {self.n_row}x{self.n_col} yards, "
+                             f"expected {kind} {n_row}x{n_col}")
+
+    def sample(self, rng: np.random.Generator, key) -> np.ndarray:
+        """
+        Copy a random scenario of a group
+        :param rng: np.random.Generator
+        :param key: stock count or stock probability of the group
+        :return: 2D array of the bank dtype
+        """
+        if str(key) not in self.groups:
+            raise KeyError(f"No scenarios for {key}, the bank holds {list(self.groups)}")
+        start, stop = self.groups[str(key)]
+        return self[int(rng.integers(start, stop))]
+
+
+def generate_group(kind: str, n_row: int, n_col: int, key, count: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    Generate count initial grids of one group
+    :param kind: one of KINDS
+    :param key: stock count (commander, transporter) or stock probability (maze)
+    :return: (count, n_row, n_col) array of bank_dtype(n_row, n_col)
+    """
+    dtype = bank_dtype(n_row, n_col)
+    grids = np.zeros((count, n_row, n_col), dtype=dtype)
+    if kind == "maze":
+        grids[:] = generate_random_maps(n_row, n_col, key, count, rng=rng)
+        return grids
+
+    stock_area = np.ones((n_row, n_col), dtype=bool)
+    stock_area[:, -1] = False
+    rows, cols = sample_cells(rng, stock_area, key, size=count)
+    batch = np.arange(count)[:, None]
+    if kind == "commander":
+        grids[batch, rows, cols] = np.arange(1, key + 1, dtype=dtype)
+    else:
+        grids[batch, rows, cols] = 1
+        grids[batch[:, 0], rows[:, 0], cols[:, 0]] = 2
+    return grids
+
+
+def write_bank(stem: str, kind: str, n_row: int, n_col: int, keys: list, per_group: int, seed: int = None):
+    """
+    Generate per_group scenarios for every key and write them to <stem>.npy and <stem>.json
+    """
+    if kind not in KINDS:
+        raise ValueError(f"Unknown kind {kind}, expected one of {KINDS}")
+    rng = np.random.default_rng(seed)
+    dtype = bank_dtype(n_row, n_col)
+    grids = np.lib.format.open_memmap(f"{stem}.npy", mode="w+", dtype=dtype,
+                                      shape=(len(keys) * per_group, n_row, n_col))
+    groups = {}
+    for i, key in enumerate(keys):
+        start = i * per_group
+        for offset in range(0, per_group, GENERATION_SLICE):
+            count = min(GENERATION_SLICE, per_group - offset)
+            grids[start + offset:start + offset + count] = generate_group(kind, n_row, n_col, key, count, rng)
+        groups[str(key)] = [start, start + per_group]
+    grids.flush()
+    with open(f"{stem}.json", "w") as f:
+        json.dump({"kind": kind, "n_row": n_row, "n_col": n_col, "dtype": dtype.name, "seed": seed, "groups": groups},
+                  f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("kind", choices=KINDS)
+    parser.add_argument("stem", help="output path without extension")
+    parser.add_argument("--size", nargs=2, type=int, default=[5, 5], metavar=("N_ROW", "N_COL"))
+    parser.add_argument("--groups", nargs=2, type=int, default=[5, 18], metavar=("MIN", "MAX"),
+                        help="stock counts of the commander and transporter groups, both included")
+    parser.add_argument("--probs", nargs="+", type=float, default=[0.5], help="stock probabilities of the maze groups")
+    parser.add_argument("--per-group", type=int, default=100_000, help="scenarios per group")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    keys = args.probs if args.kind == "maze" else list(range(args.groups[0], args.groups[1] + 1))
+    write_bank(args.stem, args.kind, args.size[0], args.size[1], keys, args.per_group, args.seed)
+
+
+if __name__ == "__main__":
+    main()
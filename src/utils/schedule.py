@@ -0,0 +1,265 @@
+"""
+Arrival and departure schedules of the schedule-driven yard (src.env.env_schedule).
+
+A schedule is any iterable of (enter, exit, value) rows sorted by enter, times are absolute and in the same unit
+as the yard's action durations. Schedule files are streamed chunk by chunk instead of being loaded whole, so many
+env processes can share a multi-GB history:
+
+    source = CsvSchedule("schedules/2023.csv", cache_dir="cache/schedules")
+    stats = source.stats()
+    schedule = NormalizedSchedule(source, stats, time_unit=60)
+    env = ScheduleYard(schedule, time_scale=stats["stay_max"] / 60)
+
+With a cache_dir, the first full pass over a file also writes its chunks as .npy files and later passes, in this
+or any other process, memory-map them instead of parsing the file again.
+"""
+import abc
+import hashlib
+import json
+import os
+import shutil
+from itertools import islice
+
+import numpy as np
+
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+ENTER = 0
+EXIT = 1
+VALUE = 2
+
+COLUMNS = ("enter", "exit", "value")
+CHUNK_SIZE = 100_000
+
+
+def random_schedule(rng: np.random.Generator, n_stocks: int, horizon: float, min_stay: float, max_stay: float,
+                    value: float = 1.0) -> np.ndarray:
+    """
+    Stocks arriving uniformly over [0, horizon) and staying between min_stay and max_stay
+    :return: (n_stocks, 3) float64 array of (enter, exit, value) rows sorted by enter
+    """
+    schedule = np.empty((n_stocks, 3), dtype=np.float64)
+    schedule[:, ENTER] = np.sort(rng.uniform(0, horizon, n_stocks))
+    schedule[:, EXIT] = schedule[:, ENTER] + rng.uniform(min_stay, max_stay, n_stocks)
+    schedule[:, VALUE] = value
+    return schedule
+
+
+def empty_stats() -> dict:
+    return {"n_stocks": 0, "enter_min": np.inf, "exit_max": -np.inf, "stay_max": 0.0, "stay_sum": 0.0,
+            "value_max": 0.0}
+
+
+def update_stats(stats: dict, chunk: np.ndarray):
+    if len(chunk) == 0:
+        return
+    stay = chunk[:, EXIT] - chunk[:, ENTER]
+    stats["n_stocks"] += len(chunk)
+    stats["enter_min"] = min(stats["enter_min"], float(chunk[:, ENTER].min()))
+    stats["exit_max"] = max(stats["exit_max"], float(chunk[:, EXIT].max()))
+    stats["stay_max"] = max(stats["stay_max"], float(stay.max()))
+    stats["stay_sum"] += float(stay.sum())
+    stats["value_max"] = max(stats["value_max"], float(np.abs(chunk[:, VALUE]).max()))
+
+
+def schedule_stats(source) -> dict:
+    """
+    One streaming pass over source
+    :return: dict of n_stocks, enter_min, exit_max, stay_max, stay_sum and value_max
+    """
+    stats = empty_stats()
+    for chunk in source.chunks():
+        update_stats(stats, chunk)
+    return stats
+
+
+class ScheduleSource(abc.ABC):
+    """
+    Schedule read chunk by chunk, iterating it yields the rows. Subclasses implement chunks().
+    Every iteration starts again from the first row, so a source can be handed to the env as its schedule.
+    """
+
+    @abc.abstractmethod
+    def chunks(self):
+        """
+        :return: generator of (n, 3) float64 arrays of (enter, exit, value) rows
+        """
+
+    def __iter__(self):
+        for chunk in self.chunks():
+            yield from chunk
+
+    def stats(self) -> dict:
+        return schedule_stats(self)
+
+
+class ArraySchedule(ScheduleSource):
+    """
+    In-memory (n, 3) array
+    """
+
+    def __init__(self, schedule: np.ndarray, chunk_size: int = CHUNK_SIZE):
+        self.schedule = np.asarray(schedule, dtype=np.float64)
+        self.chunk_size = chunk_size
+
+    def chunks(self):
+        for start in range(0, len(self.schedule), self.chunk_size):
+            yield self.schedule[start:start + self.chunk_size]
+
+
+class FileSchedule(ScheduleSource):
+    """
+    Schedule file with a column for each of enter, exit and value, optionally cached as .npy chunks.
+    Subclasses implement parse().
+    """
+
+    def __init__(self, path: str, columns: tuple = COLUMNS, chunk_size: int = CHUNK_SIZE, cache_dir: str = None):
+        """
+        :param columns: names of the enter, exit and value columns in the file
+        :param cache_dir: directory of the .npy cache, no cache if None
+        """
+        self.path = path
+        self.columns = tuple(columns)
+        self.chunk_size = chunk_size
+        self.cache_dir = cache_dir
+
+    @abc.abstractmethod
+    def parse(self):
+        """
+        :return: generator of (n, 3) float64 arrays parsed from the file
+        """
+
+    @property
+    def cache_path(self) -> str:
+        """
+        Cache of this file, columns and chunk size, a changed file gets a new cache
+        """
+        status = os.stat(self.path)
+        key = f"{os.path.abspath(self.path)}|{status.st_size}|{status.st_mtime_ns}|{self.columns}|{self.chunk_size}"
+        digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+        return os.path.join(self.cache_dir, f"{os.path.basename(self.path)}-{digest}")
+
+    def read_meta(self):
+        if self.cache_dir is None:
+            return None
+        try:
+            with open(os.path.join(self.cache_path, "meta.json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def chunks(self):
+        meta = self.read_meta()
+        if meta is not None:
+            for name in meta["chunks"]:
+                yield np.load(os.path.join(self.cache_path, name), mmap_mode="r")
+        elif self.cache_dir is None:
+            yield from self.parse()
+        else:
+            yield from self.parse_to_cache()
+
+    def parse_to_cache(self):
+        """
+        Parse the file and write its chunks to a private directory, renamed to the cache once the pass is complete.
+        An interrupted pass leaves no cache, when several processes complete one the first rename wins.
+        """
+        path = self.cache_path
+        tmp = f"{path}.tmp{os.getpid()}-{id(self)}"
+        os.makedirs(tmp, exist_ok=True)
+        names = []
+        stats = empty_stats()
+        try:
+            for chunk in self.parse():
+                name = f"chunk_{len(names):06d}.npy"
+                np.save(os.path.join(tmp, name), chunk)
+                names.append(name)
+                update_stats(stats, chunk)
+                yield chunk
+            with open(os.path.join(tmp, "meta.json"), "w") as f:
+                json.dump({"path": self.path, "columns": list(self.columns), "chunks": names, "stats": stats}, f,
+                          indent=2)
+            try:
+                os.rename(tmp, path)
+            except OSError:
+                # cached by another process in the meantime
+                pass
+        finally:
+            if os.path.isdir(tmp):
+                shutil.rmtree(tmp, ignore_errors=True)
+
+    def stats(self) -> dict:
+        """
+        Read from the cache when there is one, otherwise one pass over the file, which fills the cache
+        """
+        meta = self.read_meta()
+        if meta is not None:
+            return meta["stats"]
+        return schedule_stats(self)
+
+
+class CsvSchedule(FileSchedule):
+    """
+    CSV file with a header row. Parsed with pandas when it is installed, with numpy otherwise.
+    """
+
+    def parse(self):
+        if pd is not None:
+            for frame in pd.read_csv(self.path, usecols=list(self.columns), chunksize=self.chunk_size):
+                yield frame[list(self.columns)].to_numpy(dtype=np.float64)
+            return
+        with open(self.path) as f:
+            header = [name.strip() for name in f.readline().split(",")]
+            usecols = [header.index(name) for name in self.columns]
+            while True:
+                # EOF is checked here, loadtxt warns on empty input
+                lines = list(islice(f, self.chunk_size))
+                if not lines:
+                    return
+                rows = [line for line in lines if line.strip()]
+                if rows:
+                    yield np.loadtxt(rows, delimiter=",", usecols=usecols, ndmin=2, dtype=np.float64)
+
+
+class ParquetSchedule(FileSchedule):
+    """
+    Parquet file, needs pyarrow
+    """
+
+    def parse(self):
+        if pq is None:
+            raise ImportError("Reading Parquet schedules needs pyarrow to be installed")
+        for batch in pq.ParquetFile(self.path).iter_batches(batch_size=self.chunk_size, columns=list(self.columns)):
+            yield np.stack([batch.column(name).to_numpy(zero_copy_only=False) for name in self.columns],
+                           axis=1).astype(np.float64)
+
+
+class NormalizedSchedule(ScheduleSource):
+    """
+    Source normalized chunk by chunk with precomputed stats: times start at 0 and are counted in time_unit,
+    values are divided by the largest absolute value
+    """
+
+    def __init__(self, source: ScheduleSource, stats: dict, time_unit: float = 1.0):
+        """
+        :param time_unit: time of the schedule per time unit of the env, e.g. 60 for a schedule in seconds and
+        actions lasting minutes
+        """
+        self.source = source
+        self.origin = stats["enter_min"]
+        self.time_unit = time_unit
+        self.value_scale = stats["value_max"] or 1.0
+
+    def chunks(self):
+        for chunk in self.source.chunks():
+            normalized = np.empty_like(chunk, dtype=np.float64)
+            normalized[:, ENTER:EXIT + 1] = (chunk[:, ENTER:EXIT + 1] - self.origin) / self.time_unit
+            normalized[:, VALUE] = chunk[:, VALUE] / self.value_scale
+            yield normalized
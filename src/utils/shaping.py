@@ -0,0 +1,81 @@
+from collections import OrderedDict
+
+import numpy as np
+
+from src.utils.bitboard import Bitboard
+
+
+class DistanceShaping:
+    """
+    Potential-based reward shaping, F = gamma * phi(s') - phi(s) with phi(s) = -scale * d(goal stock),
+    where d is the BFS distance to the exit column around the other stocks.
+    Distance fields are cached per obstacle bitboard with LRU eviction, so a field is only computed
+    the first time a layout shows up.
+    """
+
+    def __init__(self, n_row: int, n_col: int, gamma: float = 0.99, scale: float = 0.1, cache_size: int = 4096):
+        self.board = Bitboard(n_row, n_col)
+        self.gamma = gamma
+        self.scale = scale
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.last_potential = 0.0
+        self.hits = 0
+        self.misses = 0
+        exit_col = 0
+        for row in range(n_row):
+            exit_col |= self.board.bit(row, n_col - 1)
+        self.exit_col = exit_col
+
+    def distance_field(self, obstacles: int) -> np.ndarray:
+        """
+        BFS distance of every cell to the exit column, n_row * n_col for cells that cannot reach it
+        :param obstacles: bitboard of the cells that cannot be crossed
+        :return: 2D int64 array
+        """
+        field = self.cache.get(obstacles)
+        if field is not None:
+            self.cache.move_to_end(obstacles)
+            self.hits += 1
+            return field
+        self.misses += 1
+
+        passable = self.board.full & ~obstacles
+        field = np.full(self.board.n_cells, self.board.n_cells, dtype=np.int64)
+        reached = frontier = self.exit_col & passable
+        distance = 0
+        while frontier:
+            field[self.board.unpack(frontier).reshape(-1).astype(bool)] = distance
+            grown = self.board.grow(reached) & passable
+            frontier = grown & ~reached
+            reached = grown
+            distance += 1
+        field = field.reshape(self.board.n_row, self.board.n_col)
+        field.flags.writeable = False
+
+        self.cache[obstacles] = field
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return field
+
+    def potential(self, obstacles: int, row: int, col: int) -> float:
+        return -self.scale * float(self.distance_field(obstacles)[row, col])
+
+    def reset(self, obstacles: int, row: int, col: int):
+        """
+        Start an episode with the goal stock at (row, col)
+        """
+        self.last_potential = self.potential(obstacles, row, col)
+
+    def shape(self, obstacles: int, row: int, col: int, done: bool = False) -> float:
+        """
+        Shaping term of one step, the potential of a terminal state is 0
+        :param obstacles: bitboard of the stocks other than the goal stock
+        :param row: row of the goal stock
+        :param col: col of the goal stock
+        :return: float to add to the reward
+        """
+        potential = 0.0 if done else self.potential(obstacles, row, col)
+        shaping = self.gamma * potential - self.last_potential
+        self.last_potential = potential
+        return shaping
@@ -0,0 +1,141 @@
+"""
+Exact A* solver for the commander puzzle, to label yards with their optimal number of moves.
+
+Costs are counted in env steps, one per load and one per unload. A move is a load followed by an unload to another
+reachable cell. Putting a stock back never helps, so those unloads are not generated. The heuristic is admissible:
+every stock outside the last column still has to be loaded and unloaded at least once, and a loaded stock has to be
+unloaded.
+
+    python -m src.utils.solver --size 4 4 --stocks 6 --count 100
+    python -m src.utils.solver --bank banks/commander_5x5 --stocks 8 --count 1000 --max-nodes 200000
+"""
+import argparse
+import heapq
+import itertools
+import json
+from typing import NamedTuple
+
+import numpy as np
+
+from src.env import yard
+from src.utils.grid import sample_cells
+from src.utils.scenario_bank import ScenarioBank
+
+
+class Solution(NamedTuple):
+    """
+    steps is None when the node budget ran out before the yard was solved
+    """
+    steps: int
+    actions: list
+    expanded: int
+
+    @property
+    def moves(self):
+        return None if self.steps is None else (self.steps + 1) // 2
+
+
+def heuristic(state: yard.YardState) -> int:
+    n_col = state.ranks.shape[1]
+    waiting = np.count_nonzero(state.ranks[:, :n_col - 1] > 0)
+    return 2 * int(waiting) + (state.loading != yard.NO_STOCK)
+
+
+def unloads(state: yard.YardState):
+    """
+    (flat action, next state) of every unload of the loaded stock that moves it
+    """
+    n_col = state.ranks.shape[1]
+    origin = state.loaded_row * n_col + state.loaded_col
+    for action in np.flatnonzero(yard.action_mask(state)):
+        if action != origin:
+            yield int(action), yard.transition(state, action // n_col, action % n_col)[0]
+
+
+def successors(state: yard.YardState):
+    """
+    (actions, cost, next state) of every move from state
+    """
+    if state.loading != yard.NO_STOCK:
+        for action, next_state in unloads(state):
+            yield (action,), 1, next_state
+        return
+    n_col = state.ranks.shape[1]
+    for load in np.flatnonzero(state.ranks.reshape(-1) > 0):
+        loaded = yard.transition(state, load // n_col, load % n_col)[0]
+        for action, next_state in unloads(loaded):
+            yield (int(load), action), 2, next_state
+
+
+def solve(state: yard.YardState, max_nodes: int = 100_000) -> Solution:
+    """
+    A* search with a transposition table keyed by YardState.key()
+    :param state: start state
+    :param max_nodes: give up after expanding this many states
+    :return: Solution
+    """
+    start = state._replace(n_steps=0)
+    counter = itertools.count()
+    best_cost = {start.key(): 0}
+    parents = {start.key(): None}
+    # ties go to the deeper node, it is closer to a solution
+    frontier = [(heuristic(start), 0, next(counter), start)]
+    expanded = 0
+    while frontier and expanded < max_nodes:
+        _, negative_cost, _, state = heapq.heappop(frontier)
+        cost = -negative_cost
+        key = state.key()
+        if cost > best_cost[key]:
+            continue
+        if state.done:
+            actions = []
+            while parents[key] is not None:
+                key, step_actions = parents[key]
+                actions[:0] = step_actions
+            return Solution(cost, actions, expanded)
+        expanded += 1
+        for step_actions, step_cost, next_state in successors(state):
+            next_key = next_state.key()
+            next_cost = cost + step_cost
+            if next_cost < best_cost.get(next_key, next_cost + 1):
+                best_cost[next_key] = next_cost
+                parents[next_key] = (key, step_actions)
+                heapq.heappush(frontier, (next_cost + heuristic(next_state), -next_cost, next(counter), next_state))
+    return Solution(None, [], expanded)
+
+
+def random_state(rng: np.random.Generator, n_row: int, n_col: int, n_stocks: int) -> yard.YardState:
+    stock_area = np.ones((n_row, n_col), dtype=bool)
+    stock_area[:, -1] = False
+    rows, cols = sample_cells(rng, stock_area, n_stocks)
+    ranks = np.zeros((n_row, n_col), dtype=np.int64)
+    ranks[rows, cols] = np.arange(1, n_stocks + 1)
+    return yard.make_state(ranks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", nargs=2, type=int, default=[4, 4], metavar=("N_ROW", "N_COL"))
+    parser.add_argument("--stocks", type=int, default=6)
+    parser.add_argument("--count", type=int, default=100, help="number of yards to solve")
+    parser.add_argument("--bank", default=None, help="solve the first yards of this commander scenario bank group")
+    parser.add_argument("--max-nodes", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.bank is None:
+        rng = np.random.default_rng(args.seed)
+        states = (random_state(rng, args.size[0], args.size[1], args.stocks) for _ in range(args.count))
+    else:
+        bank = ScenarioBank(args.bank)
+        start, stop = bank.groups[str(args.stocks)]
+        states = (yard.make_state(bank[i]) for i in range(start, min(stop, start + args.count)))
+
+    for i, state in enumerate(states):
+        solution = solve(state, args.max_nodes)
+        print(json.dumps({"scenario": i, "moves": solution.moves, "steps": solution.steps,
+                          "expanded": solution.expanded}), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""
+Columnar on-disk log of env transitions, for offline analysis and offline RL.
+
+TrajectoryRecorder copies every observation, action, reward and done flag into preallocated column buffers. When a
+buffer is full it is written as one chunk by a background thread while recording goes on in a second buffer. A
+recording is a directory:
+    meta.json            columns (shape, dtype) and the file and number of rows of every chunk
+    chunk_000000.npz     compressed chunk, or
+    chunk_000000/        uncompressed chunk, one <column>.npy per column, memory-mapped by the reader
+
+Each row holds the observation after an action together with that action, its reward and done flags. Rows with
+first set hold the observation of a reset and no action. Columns with at most 256 distinct values in a chunk, like
+the grids, are dictionary encoded: <column>.codes is uint8 and <column>.palette holds the values.
+
+    env = TrajectoryRecorder(GridCommander(), "runs/commander_0")
+    ...
+    env.close()
+    for batch in TrajectoryReader("runs/commander_0").transitions():
+        batch["obs.grid"], batch["action"], batch["next.obs.grid"]
+"""
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import gymnasium as gym
+import numpy as np
+
+CHUNK_SIZE = 65_536
+MAX_PALETTE = 256
+
+
+def flatten_obs(obs) -> dict:
+    if isinstance(obs, dict):
+        return {f"obs.{key}": value for key, value in obs.items()}
+    return {"obs": obs}
+
+
+def encode_chunk(columns: dict) -> dict:
+    """
+    :param columns: dict of name -> array of the rows of one chunk
+    :return: dict of array name -> array, dictionary encoded where it fits in uint8
+    """
+    arrays = {}
+    for name, column in columns.items():
+        palette, codes = np.unique(column, return_inverse=True)
+        if len(palette) <= MAX_PALETTE:
+            arrays[f"{name}.codes"] = codes.astype(np.uint8).reshape(column.shape)
+            arrays[f"{name}.palette"] = palette
+        else:
+            arrays[name] = column
+    return arrays
+
+
+def decode_chunk(arrays) -> dict:
+    columns = {}
+    for name in arrays:
+        if name.endswith(".codes"):
+            column = name[:-len(".codes")]
+            columns[column] = arrays[f"{column}.palette"][arrays[name]]
+        elif not name.endswith(".palette"):
+            columns[name] = arrays[name]
+    return columns
+
+
+class TrajectoryWriter:
+    """
+    Appends rows to column buffers and writes them out chunk by chunk.
+    The buffers are allocated from the first row, so every row must have the same columns, shapes and dtypes.
+    """
+
+    def __init__(self, root: str, chunk_size: int = CHUNK_SIZE, compress: bool = True):
+        os.makedirs(root, exist_ok=True)
+        self.root = root
+        self.chunk_size = chunk_size
+        self.compress = compress
+        self.columns = None
+        # two buffer sets, rows go to one while the other is being written
+        self.buffers = []
+        self.active = 0
+        self.n_rows = 0
+        self.chunks = []
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.pending = None
+
+    def allocate(self, row: dict):
+        self.columns = {name: (np.shape(value), np.asarray(value).dtype) for name, value in row.items()}
+        self.buffers = [
+            {name: np.empty((self.chunk_size,) + shape, dtype=dtype) for name, (shape, dtype) in self.columns.items()}
+            for _ in range(2)
+        ]
+
+    def append(self, row: dict):
+        if self.columns is None:
+            self.allocate(row)
+        buffers = self.buffers[self.active]
+        for name, value in row.items():
+            buffers[name][self.n_rows] = value
+        self.n_rows += 1
+        if self.n_rows == self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Hand the buffered rows to the writer thread and switch to the other buffer set
+        """
+        if self.n_rows == 0:
+            return
+        self.wait()
+        index = len(self.chunks)
+        name = f"chunk_{index:06d}" + (".npz" if self.compress else "")
+        self.chunks.append({"file": name, "rows": self.n_rows})
+        columns = {key: buffer[:self.n_rows] for key, buffer in self.buffers[self.active].items()}
+        self.pending = self.executor.submit(self.write_chunk, name, columns)
+        self.active = 1 - self.active
+        self.n_rows = 0
+
+    def write_chunk(self, name: str, columns: dict):
+        arrays = encode_chunk(columns)
+        path = os.path.join(self.root, name)
+        if self.compress:
+            np.savez_compressed(path, **arrays)
+        else:
+            os.makedirs(path, exist_ok=True)
+            for key, array in arrays.items():
+                np.save(os.path.join(path, f"{key}.npy"), array)
+        self.write_meta()
+
+    def write_meta(self):
+        columns = {name: {"shape": list(shape), "dtype": str(dtype)} for name, (shape, dtype) in self.columns.items()}
+        meta = {"chunk_size": self.chunk_size, "compress": self.compress, "columns": columns,
+                "chunks": list(self.chunks)}
+        path = os.path.join(self.root, "meta.json")
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(meta, f, indent=2)
+        os.replace(f"{path}.tmp", path)
+
+    def wait(self):
+        if self.pending is not None:
+            self.pending.result()
+            self.pending = None
+
+    def close(self):
+        self.flush()
+        self.wait()
+        self.executor.shutdown()
+
+
+class TrajectoryRecorder(gym.Wrapper):
+    """
+    Records every reset and step of env with a TrajectoryWriter. Give every env of a VecEnv its own root.
+    """
+
+    def __init__(self, env: gym.Env, root: str, chunk_size: int = CHUNK_SIZE, compress: bool = True):
+        super().__init__(env)
+        self.writer = TrajectoryWriter(root, chunk_size, compress)
+        self.no_action = np.zeros(env.action_space.shape, dtype=env.action_space.dtype)
+
+    def record(self, obs, action, reward, terminated: bool, truncated: bool, first: bool):
+        row = flatten_obs(obs)
+        row["action"] = action
+        row["reward"] = np.float32(reward)
+        row["terminated"] = terminated
+        row["truncated"] = truncated
+        row["first"] = first
+        self.writer.append(row)
+
+    def reset(self, **kwargs):
+        obs, info = self.env.reset(**kwargs)
+        self.record(obs, self.no_action, 0, False, False, True)
+        return obs, info
+
+    def step(self, action):
+        obs, reward, terminated, truncated, info = self.env.step(action)
+        self.record(obs, action, reward, terminated, truncated, False)
+        return obs, reward, terminated, truncated, info
+
+    def close(self):
+        self.writer.close()
+        super().close()
+
+
+class TrajectoryReader:
+    """
+    Read-only access to a recording, uncompressed chunks are memory-mapped
+    """
+
+    def __init__(self, root: str):
+        with open(os.path.join(root, "meta.json")) as f:
+            meta = json.load(f)
+        self.root = root
+        self.columns = meta["columns"]
+        self.chunks = meta["chunks"]
+
+    def __len__(self):
+        return sum(chunk["rows"] for chunk in self.chunks)
+
+    def chunk(self, index: int) -> dict:
+        """
+        :return: dict of column -> decoded array of the rows of chunk index
+        """
+        path = os.path.join(self.root, self.chunks[index]["file"])
+        if path.endswith(".npz"):
+            with np.load(path) as arrays:
+                return decode_chunk({name: arrays[name] for name in arrays.files})
+        arrays = {name[:-len(".npy")]: np.load(os.path.join(path, name), mmap_mode="r") for name in os.listdir(path)}
+        return decode_chunk(arrays)
+
+    def __iter__(self):
+        for index in range(len(self.chunks)):
+            yield self.chunk(index)
+
+    def column(self, name: str) -> np.ndarray:
+        return np.concatenate([chunk[name] for chunk in self])
+
+    def transitions(self):
+        """
+        (s, a, r, s') batches, one per chunk. Columns are named as in the recording, the next observations get a
+        "next." prefix. Episodes crossing a chunk boundary are stitched.
+        """
+        previous = None
+        for chunk in self:
+            if previous is not None:
+                chunk = {name: np.concatenate([previous[name], column]) for name, column in chunk.items()}
+            # every row but the first of an episode closes a transition started by the row before it
+            index = np.flatnonzero(~chunk["first"][1:]) + 1
+            batch = {name: column[index - 1] for name, column in chunk.items() if name.startswith("obs")}
+            for name, column in chunk.items():
+                if name.startswith("obs"):
+                    batch[f"next.{name}"] = column[index]
+                elif name != "first":
+                    batch[name] = column[index]
+            previous = {name: column[-1:] for name, column in chunk.items()}
+            yield batch
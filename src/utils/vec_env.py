@@ -0,0 +1,208 @@
+import argparse
+import ctypes
+import multiprocessing as mp
+
+import numpy as np
+from stable_baselines3.common.env_util import is_wrapped
+from stable_baselines3.common.vec_env import DummyVecEnv, SubprocVecEnv, VecEnv
+from stable_baselines3.common.vec_env.base_vec_env import CloudpickleWrapper
+from stable_baselines3.common.vec_env.util import dict_to_obs, obs_space_info
+
+BACKENDS = ("dummy", "subproc", "shm")
+
+
+def _shared_buffers(buffers, index):
+    """
+    Numpy views of one worker's slot in the shared observation buffers
+    :param buffers: dict of key -> (RawArray, shape, dtype) for all workers
+    :param index: worker index
+    :return: dict of key -> ndarray
+    """
+    return {
+        key: np.frombuffer(raw, dtype=dtype).reshape((-1,) + shape)[index]
+        for key, (raw, shape, dtype) in buffers.items()
+    }
+
+
+def _write_obs(views, obs):
+    if None in views:
+        views[None][...] = obs
+    else:
+        for key, view in views.items():
+            view[...] = obs[key]
+
+
+def _worker(remote, parent_remote, env_fn_wrapper, buffers, index):
+    parent_remote.close()
+    env = env_fn_wrapper.var()
+    views = _shared_buffers(buffers, index)
+    while True:
+        try:
+            cmd, data = remote.recv()
+            if cmd == "step":
+                obs, reward, terminated, truncated, info = env.step(data)
+                done = terminated or truncated
+                info["TimeLimit.truncated"] = truncated and not terminated
+                reset_info = {}
+                if done:
+                    info["terminal_observation"] = obs
+                    obs, reset_info = env.reset()
+                _write_obs(views, obs)
+                remote.send((reward, done, info, reset_info))
+            elif cmd == "reset":
+                seed, options = data
+                obs, reset_info = env.reset(seed=seed, options=options)
+                _write_obs(views, obs)
+                remote.send(reset_info)
+            elif cmd == "close":
+                env.close()
+                remote.close()
+                break
+            elif cmd == "get_attr":
+                remote.send(getattr(env, data))
+            elif cmd == "set_attr":
+                remote.send(setattr(env, data[0], data[1]))
+            elif cmd == "env_method":
+                method_name, args, kwargs = data
+                remote.send(getattr(env, method_name)(*args, **kwargs))
+            elif cmd == "is_wrapped":
+                remote.send(is_wrapped(env, data))
+            else:
+                raise NotImplementedError(f"`{cmd}` is not implemented in the worker")
+        except EOFError:
+            break
+
+
+class SharedMemoryVecEnv(VecEnv):
+    """
+    Runs each env in its own process like SubprocVecEnv, but observations are written by the workers
+    straight into shared numpy buffers instead of being pickled through the pipes.
+    Only actions, rewards, dones and infos go through the pipes.
+    """
+
+    def __init__(self, env_fns, start_method: str = None):
+        self.waiting = False
+        self.closed = False
+        n_envs = len(env_fns)
+
+        if start_method is None:
+            start_method = "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+        ctx = mp.get_context(start_method)
+
+        # the first env is only built here to read the spaces
+        probe = env_fns[0]()
+        observation_space, action_space = probe.observation_space, probe.action_space
+        probe.close()
+
+        self.keys, shapes, dtypes = obs_space_info(observation_space)
+        self.buffers = {}
+        for key in self.keys:
+            shape, dtype = shapes[key], np.dtype(dtypes[key])
+            raw = ctx.RawArray(ctypes.c_byte, n_envs * int(np.prod(shape, dtype=np.int64)) * dtype.itemsize)
+            self.buffers[key] = (raw, shape, dtype)
+        self.buf_obs = {
+            key: np.frombuffer(raw, dtype=dtype).reshape((n_envs,) + shape)
+            for key, (raw, shape, dtype) in self.buffers.items()
+        }
+
+        self.remotes, self.work_remotes = zip(*[ctx.Pipe() for _ in range(n_envs)])
+        self.processes = []
+        for index, (work_remote, remote, env_fn) in enumerate(zip(self.work_remotes, self.remotes, env_fns)):
+            args = (work_remote, remote, CloudpickleWrapper(env_fn), self.buffers, index)
+            process = ctx.Process(target=_worker, args=args, daemon=True)
+            process.start()
+            self.processes.append(process)
+            work_remote.close()
+
+        super().__init__(n_envs, observation_space, action_space)
+
+    def _obs_from_buf(self):
+        return dict_to_obs(self.observation_space, {key: buf.copy() for key, buf in self.buf_obs.items()})
+
+    def step_async(self, actions: np.ndarray):
+        for remote, action in zip(self.remotes, actions):
+            remote.send(("step", action))
+        self.waiting = True
+
+    def step_wait(self):
+        results = [remote.recv() for remote in self.remotes]
+        self.waiting = False
+        rewards, dones, infos, self.reset_infos = zip(*results)
+        return self._obs_from_buf(), np.array(rewards, dtype=np.float32), np.array(dones, dtype=bool), list(infos)
+
+    def reset(self):
+        for env_idx, remote in enumerate(self.remotes):
+            remote.send(("reset", (self._seeds[env_idx], self._options[env_idx])))
+        self.reset_infos = [remote.recv() for remote in self.remotes]
+        self._reset_seeds()
+        self._reset_options()
+        return self._obs_from_buf()
+
+    def close(self):
+        if self.closed:
+            return
+        if self.waiting:
+            for remote in self.remotes:
+                remote.recv()
+        for remote in self.remotes:
+            remote.send(("close", None))
+        for process in self.processes:
+            process.join()
+        self.closed = True
+
+    def get_attr(self, attr_name: str, indices=None):
+        target_remotes = self._get_target_remotes(indices)
+        for remote in target_remotes:
+            remote.send(("get_attr", attr_name))
+        return [remote.recv() for remote in target_remotes]
+
+    def set_attr(self, attr_name: str, value, indices=None):
+        target_remotes = self._get_target_remotes(indices)
+        for remote in target_remotes:
+            remote.send(("set_attr", (attr_name, value)))
+        for remote in target_remotes:
+            remote.recv()
+
+    def env_method(self, method_name: str, *method_args, indices=None, **method_kwargs):
+        target_remotes = self._get_target_remotes(indices)
+        for remote in target_remotes:
+            remote.send(("env_method", (method_name, method_args, method_kwargs)))
+        return [remote.recv() for remote in target_remotes]
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        target_remotes = self._get_target_remotes(indices)
+        for remote in target_remotes:
+            remote.send(("is_wrapped", wrapper_class))
+        return [remote.recv() for remote in target_remotes]
+
+    def _get_target_remotes(self, indices):
+        return [self.remotes[i] for i in self._get_indices(indices)]
+
+
+def add_vec_env_arguments(parser: argparse.ArgumentParser):
+    """
+    Add --num-envs and --backend to a training script's argument parser
+    """
+    parser.add_argument("--num-envs", type=int, default=1, help="number of env workers")
+    parser.add_argument("--backend", choices=BACKENDS, default="dummy",
+                        help="dummy: all envs in this process, subproc: SB3 SubprocVecEnv, "
+                             "shm: worker processes with shared-memory observations")
+    return parser
+
+
+def make_vec_env(env_fn, num_envs: int = 1, backend: str = "dummy"):
+    """
+    Build num_envs copies of env_fn() behind the chosen backend
+    :param env_fn: callable returning a gym.Env, it must be picklable with cloudpickle for subproc and shm
+    :param num_envs: number of envs
+    :param backend: one of BACKENDS
+    :return: VecEnv
+    """
+    env_fns = [env_fn for _ in range(num_envs)]
+    if backend == "dummy":
+        return DummyVecEnv(env_fns)
+    if backend == "subproc":
+        return SubprocVecEnv(env_fns)
+    if backend == "shm":
+        return SharedMemoryVecEnv(env_fns)
+    raise ValueError(f"Unknown backend {backend}, expected one of {BACKENDS}")
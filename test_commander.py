@@ -1,9 +1,17 @@
+import argparse
+
 import gymnasium
 from stable_baselines3 import DQN, A2C, PPO
 
 from src.env.commander import GridCommander, CommanderWrapper
+from src.utils.vec_env import add_vec_env_arguments, make_vec_env
+
+
+def make_env():
+    return CommanderWrapper(GridCommander(5, 5))
+
 
-env = GridCommander(5, 5)
+# env = GridCommander(5, 5)
 # env.reset()
 # env.place_random_stocks(5)
 # env = CommanderWrapper(env)
@@ -24,10 +32,12 @@ env = GridCommander(5, 5)
 #         print("reset", reset)
 
 
-discreteEnv = CommanderWrapper(env)
+if __name__ == "__main__":
+    args = add_vec_env_arguments(argparse.ArgumentParser()).parse_args()
+    discreteEnv = make_vec_env(make_env, args.num_envs, args.backend)
 
-ppo = DQN("MultiInputPolicy", discreteEnv, verbose=1, tensorboard_log="./logs/6_10/DQN_5M_LargeDNN_penalty01_stocks18", policy_kwargs={"net_arch": [3200, 1600, 800, 400, 200, 100]})
-ppo.learn(total_timesteps=5_000_000)
-ppo.save("models/6_10/DQN_commander_5M_Large_DNN_penalty01_stocks5to18-10K")
+    ppo = DQN("MultiInputPolicy", discreteEnv, verbose=1, tensorboard_log="./logs/6_10/DQN_5M_LargeDNN_penalty01_stocks18", policy_kwargs={"net_arch": [3200, 1600, 800, 400, 200, 100]})
+    ppo.learn(total_timesteps=5_000_000)
+    ppo.save("models/6_10/DQN_commander_5M_Large_DNN_penalty01_stocks5to18-10K")
 
 # [1, 23, 3].reverse()
\ No newline at end of file
@@ -1,13 +1,16 @@
+import argparse
+
 import gymnasium as gym
 import stable_baselines3 as sb3
 
 from src.env.commander import GridCommander, CommanderWrapper
+from src.utils.vec_env import add_vec_env_arguments, make_vec_env
 import torch as th
 from torch import nn
 
-env = GridCommander(5, 5)
 
-discreteEnv = CommanderWrapper(env)
+def make_env():
+    return CommanderWrapper(GridCommander(5, 5))
 
 
 class Extractor(sb3.common.torch_layers.BaseFeaturesExtractor):
@@ -33,9 +36,13 @@ policy_kwargs = {
     "features_extractor_class": Extractor,
 }
 
-ppo = sb3.DQN("MultiInputPolicy", discreteEnv, verbose=1,
-              tensorboard_log="./logs/commander/dqn_5M_256x4_penalty00_stocks18_smallCNN",
-              policy_kwargs=policy_kwargs, exploration_initial_eps=0.35)
-print(ppo.policy)
-ppo.learn(total_timesteps=5_000_000)
-ppo.save("dqn_commander_5M_256x4_penalty00_stocks5to18-10K_smallCNN")
+if __name__ == "__main__":
+    args = add_vec_env_arguments(argparse.ArgumentParser()).parse_args()
+    discreteEnv = make_vec_env(make_env, args.num_envs, args.backend)
+
+    ppo = sb3.DQN("MultiInputPolicy", discreteEnv, verbose=1,
+                  tensorboard_log="./logs/commander/dqn_5M_256x4_penalty00_stocks18_smallCNN",
+                  policy_kwargs=policy_kwargs, exploration_initial_eps=0.35)
+    print(ppo.policy)
+    ppo.learn(total_timesteps=5_000_000)
+    ppo.save("dqn_commander_5M_256x4_penalty00_stocks5to18-10K_smallCNN")
@@ -1,11 +1,19 @@
+import argparse
+
 from stable_baselines3 import DQN, A2C, PPO
 
 from src.env.commander_discrete import DiscreteCommander, CommanderWrapper
+from src.utils.vec_env import add_vec_env_arguments, make_vec_env
+
+
+def make_env():
+    return CommanderWrapper(DiscreteCommander(5, 5))
 
-env = DiscreteCommander(5, 5)
 
-env.reset()
-env.place_random_stocks(5)
+# env = DiscreteCommander(5, 5)
+#
+# env.reset()
+# env.place_random_stocks(5)
 # env = CommanderWrapper(env)
 #
 # while True:
@@ -24,14 +32,15 @@ env.place_random_stocks(5)
 #         print("reset", reset)
 
 
-discreteEnv = CommanderWrapper(env)
-
-print(f"observation space: {discreteEnv.observation_space}")
+if __name__ == "__main__":
+    args = add_vec_env_arguments(argparse.ArgumentParser()).parse_args()
+    discreteEnv = make_vec_env(make_env, args.num_envs, args.backend)
 
+    print(f"observation space: {discreteEnv.observation_space}")
 
-ppo = PPO("MultiInputPolicy", discreteEnv, verbose=1, tensorboard_log="./logs/6_10/DQN_5MDNN_penalty01_stocks18",
-          policy_kwargs={"net_arch": [2500,1000,250,100]})
-ppo.learn(total_timesteps=5_000_000)
-ppo.save("models/6_10/DQN_commander_5M_DNN_penalty01_stocks5to18-10K")
+    ppo = PPO("MultiInputPolicy", discreteEnv, verbose=1, tensorboard_log="./logs/6_10/DQN_5MDNN_penalty01_stocks18",
+              policy_kwargs={"net_arch": [2500,1000,250,100]})
+    ppo.learn(total_timesteps=5_000_000)
+    ppo.save("models/6_10/DQN_commander_5M_DNN_penalty01_stocks5to18-10K")
 
 # [1, 23, 3].reverse()
@@ -0,0 +1,11 @@
+import pytest
+
+from benchmarks.check_kernel_parity import ENVS, check
+
+
+@pytest.mark.parametrize("name", list(ENVS))
+def test_kernel_matches_transition(name):
+    """
+    The kernel path of every commander env has to stay step for step equal to its python transition
+    """
+    assert check(ENVS[name], 4, 2_000, seed=0)